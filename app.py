@@ -1,27 +1,56 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import Flask, Response, render_template, redirect, url_for, flash, request, jsonify, send_file, send_from_directory, abort, stream_with_context
 from config import Config
-from models import db, User, Book, Cart, CartItem, Order, OrderItem
+from models import db, User, Book, Cart, CartItem, Order, OrderItem, StockReservation, utcnow
 from forms import RegisterForm, LoginForm, ChangePasswordForm, BookForm
+from search import init_search, search_books, prefix_filter
+from pagination import keyset_paginate
+from cache import cache
+from querycount import init_query_guard
+from metrics import init_metrics, render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiling import init_profiling, list_profiles, PROFILE_NAME
+from identity import load_identity, invalidate_identity
+from passwords import init_passwords
+from inventory import begin_write, take_stock, return_stock, quantities_of, apply_changes
+from reservations import available_stock, reserved_quantities, reserve, release, sweep, run_sweeper
+from recommendations import recommended_books, on_order_status_change, invalidate_user, rebuild_all
+from invoices import expected_kind, issue_invoice, stored_invoice_path, render_range
+from uploads import UploadRequest, ImageTooLarge, human_size
+from synthetic import generate as generate_data
+import reports
+from rollups import on_order_status_change as update_rollups, rebuild as rebuild_rollups
+from catalog_io import init_catalog_io, import_books, export_books, read_rows, format_for, CatalogFormatError, MIMETYPES as CATALOG_MIMETYPES
+from images import init_images, enqueue_cover, build_all, save_cover, is_fingerprinted, rehash_uploads
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
 from dotenv import load_dotenv
-from werkzeug.utils import secure_filename
 from urllib.parse import urlparse, urljoin
+from sqlalchemy import or_
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
 from flask_wtf import CSRFProtect
-import os
+import hmac
 import logging
+import click
+import time
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # --- Configuración inicial ---
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config.from_object(Config)
 
+init_metrics(app)
+init_profiling(app)
 db.init_app(app)
+cache.init_app(app)
+init_query_guard(app)
+init_images(app)
+init_passwords(app)
+init_catalog_io(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
 login_manager = LoginManager(app)
@@ -30,6 +59,7 @@ login_manager.login_view = 'login'
 # Crear tablas si no existen
 with app.app_context():
     db.create_all()
+    init_search()
 
 
 # --- Seguridad para URLs ---
@@ -40,10 +70,36 @@ def is_safe_url(target):
     return test_url.scheme in ('http', 'https') and ref_url.netloc == test_url.netloc
 
 
+# --- Categorías (en caché) ---
+CATEGORIES_CACHE_KEY = 'book_categories'
+ADMIN_STATS_CACHE_KEY = 'admin_overview'
+
+
+def get_categories():
+    """Lista de categorías existentes (no nulas), ordenada. Se guarda en caché."""
+    def load():
+        return [c[0] for c in db.session.query(Book.category).filter(Book.category != None).distinct().order_by(Book.category).all()]
+    return cache.get_or_set(CATEGORIES_CACHE_KEY, load, ttl=app.config['CATEGORY_CACHE_TTL'])
+
+
+def invalidate_categories():
+    """Se llama después de crear, editar o eliminar libros."""
+    cache.delete(CATEGORIES_CACHE_KEY)
+
+
+def parse_date(value):
+    """Convierte 'YYYY-MM-DD' en datetime; devuelve None si está vacío o es inválido."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
 # --- Cargar usuario ---
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    # Instantánea en caché (sin consultar users); ver identity.py
+    return load_identity(int(user_id))
 
 
 # --- Decorador para admin ---
@@ -60,6 +116,12 @@ def admin_required(fn):
     return wrapper
 
 
+ORDER_STATUSES = ['created', 'paid', 'shipped', 'delivered', 'cancelled']
+
+# Carga de un pedido con su usuario, ítems y libros en 2 consultas (detalle y factura)
+ORDER_DETAIL_OPTIONS = (joinedload(Order.user), selectinload(Order.items))
+
+
 # --- Rutas principales ---
 @app.route('/')
 def index():
@@ -75,7 +137,7 @@ def register():
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
         user.set_password(form.password.data)
-        if User.query.count() == 0:
+        if not db.session.query(User.query.exists()).scalar():
             user.role = 'admin'  # Primer usuario será admin
         db.session.add(user)
         db.session.commit()
@@ -95,6 +157,10 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user and user.check_password(form.password.data):
+            # Hash generado con otro algoritmo/costo: se actualiza ahora que tenemos la contraseña
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user)
             flash('Has ingresado correctamente.', 'success')
             return redirect(url_for('index'))
@@ -115,12 +181,14 @@ def logout():
 def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
-        if not current_user.check_password(form.current_password.data):
+        user = current_user.load()
+        if not user.check_password(form.current_password.data):
             flash('Contraseña actual incorrecta.', 'danger')
             return render_template('change_password.html', form=form)
 
-        current_user.set_password(form.new_password.data)
+        user.set_password(form.new_password.data)
         db.session.commit()
+        invalidate_identity(user.id)
         flash('Contraseña actualizada correctamente.', 'success')
         return redirect(url_for('index'))
     return render_template('change_password.html', form=form)
@@ -131,8 +199,91 @@ def change_password():
 @login_required
 @admin_required
 def admin():
-    users = User.query.all()
-    return render_template('admin.html', users=users)
+    # Contadores agregados (ver reports.overview), en caché unos segundos
+    stats = cache.get_or_set(
+        ADMIN_STATS_CACHE_KEY,
+        lambda: reports.overview(utcnow().date(), app.config['LOW_STOCK_THRESHOLD']),
+        ttl=app.config['ADMIN_STATS_TTL'],
+    )
+    return render_template('admin.html', stats=stats, funnel=reports.FUNNEL,
+                           low_stock=app.config['LOW_STOCK_THRESHOLD'])
+
+
+@app.route('/admin/cache')
+@login_required
+@admin_required
+def admin_cache_stats():
+    """Aciertos y fallos de la caché por clave."""
+    return jsonify(cache.stats())
+
+
+@app.route('/admin/profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    """Perfiles de peticiones guardados por profiling.py."""
+    return render_template('admin_profiles.html', profiles=list_profiles(app.config['PROFILE_DIR']))
+
+
+@app.route('/admin/profiles/<name>')
+@login_required
+@admin_required
+def admin_profile_download(name):
+    if not PROFILE_NAME.match(name):
+        abort(404)
+    return send_from_directory(app.config['PROFILE_DIR'], name, as_attachment=True, mimetype='text/plain')
+
+
+@app.route('/metrics')
+def metrics():
+    """Métricas por endpoint en formato Prometheus (ver metrics.py)."""
+    token = app.config['METRICS_TOKEN']
+    allowed = (
+        getattr(current_user, 'is_admin', False)
+        or (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'))
+        # Detrás de un proxy local todas las peticiones vienen de localhost: solo si se activa
+        or (app.config['METRICS_ALLOW_LOCALHOST'] and request.remote_addr in ('127.0.0.1', '::1'))
+    )
+    if not allowed:
+        abort(403)
+    return Response(render_metrics(app), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.errorhandler(503)
+def service_busy(e):
+    """Pool de contraseñas saturado (ver passwords.py): se pide reintentar"""
+    flash(e.description, 'warning')
+    response = redirect(request.url)
+    if e.retry_after:
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+# --- Portadas ---
+COVER_MAX_AGE = 365 * 24 * 3600
+
+
+@app.errorhandler(413)
+@app.errorhandler(415)
+def upload_rejected(e):
+    """Subida cortada por tamaño o por no ser una imagen válida (ver uploads.py)"""
+    if e.code == 413 and not isinstance(e, ImageTooLarge):
+        message = f"El archivo supera el tamaño máximo de {human_size(request.max_content_length)}."
+    else:
+        message = e.description
+    flash(message, 'danger')
+    return redirect(request.url)
+
+
+@app.route('/covers/<path:filename>')
+def cover_file(filename):
+    """Sirve portadas y variantes. Un nombre con hash nunca cambia de contenido,
+    así que el navegador puede guardarlo un año sin revalidar."""
+    if is_fingerprinted(filename):
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=COVER_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
+    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
 
 # --- CRUD Libros ---
@@ -140,10 +291,67 @@ def admin():
 @login_required
 @admin_required
 def admin_books():
-    books = Book.query.order_by(Book.id.desc()).all()
+    books = keyset_paginate(Book.query, Book.id, app.config['PAGE_SIZE'])
     return render_template('admin_books.html', books=books)
 
 
+@app.route('/admin/books/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_import_books():
+    """Importación masiva desde un CSV o JSON Lines (ver catalog_io.py)"""
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        fmt = format_for(upload.filename) if upload else None
+        if not upload or not upload.filename:
+            flash('Selecciona un archivo.', 'warning')
+        elif fmt is None:
+            flash('Formato no soportado: usa un archivo .csv o .jsonl.', 'danger')
+        else:
+            try:
+                result = import_books(upload.stream, fmt, batch_size=app.config['BOOK_IMPORT_BATCH_SIZE'])
+            except CatalogFormatError as e:
+                flash(str(e), 'danger')
+            invalidate_categories()
+            if result:
+                flash(f'Importación terminada. {result.summary()}.', 'warning' if result.error_count else 'success')
+    return render_template('admin_import_books.html', result=result,
+                           max_size=human_size(app.config['BOOK_IMPORT_MAX_BYTES']))
+
+
+@app.route('/admin/books/export')
+@login_required
+@admin_required
+def admin_export_books():
+    """Descarga el catálogo completo, generado por partes"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in CATALOG_MIMETYPES:
+        abort(404)
+    filename = f"libros-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return Response(stream_with_context(export_books(fmt)), mimetype=CATALOG_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.route('/admin/books/bulk-update', methods=['POST'])
+@login_required
+@admin_required
+def admin_bulk_update_books():
+    """Cambios masivos de stock y precio en JSON, por lotes atómicos (ver inventory.py).
+
+    Cuerpo: ``[{"id": 1, "stock_delta": -2, "price": 9.99}, ...]`` o ``{"changes": [...]}``;
+    ``stock_delta`` y ``price`` son opcionales (al menos uno). Devuelve el resumen.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('changes')
+    if not isinstance(data, list):
+        return jsonify(error='Se esperaba una lista de cambios en JSON.'), 400
+    rows = ((n, item, None) if isinstance(item, dict) else (n, None, 'Se esperaba un objeto JSON.')
+            for n, item in enumerate(data, 1))
+    return jsonify(apply_changes(rows, batch_size=app.config['BULK_UPDATE_BATCH_SIZE']))
+
+
 @app.route('/admin/books/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -153,11 +361,9 @@ def create_book():
         filename = None
         if form.cover.data:
             try:
-                f = form.cover.data
-                filename = secure_filename(f.filename)
-                upload_folder = os.path.join('static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                f.save(os.path.join(upload_folder, filename))
+                filename, is_new = save_cover(form.cover.data)
+                if is_new:
+                    enqueue_cover(filename)
             except OSError as e:
                 app.logger.error(f"Error al guardar la imagen: {e}")
                 flash("Error al guardar la imagen.", "danger")
@@ -173,6 +379,7 @@ def create_book():
         )
         db.session.add(book)
         db.session.commit()
+        invalidate_categories()
         flash('Libro creado correctamente.', 'success')
         return redirect(url_for('admin_books'))
     return render_template('edit_book.html', form=form, action='Crear')
@@ -187,12 +394,10 @@ def edit_book(book_id):
     if form.validate_on_submit():
         if form.cover.data:
             try:
-                f = form.cover.data
-                filename = secure_filename(f.filename)
-                upload_folder = os.path.join('static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                f.save(os.path.join(upload_folder, filename))
+                filename, is_new = save_cover(form.cover.data)
                 book.cover_filename = filename
+                if is_new:
+                    enqueue_cover(filename)
             except OSError as e:
                 app.logger.error(f"Error al actualizar la imagen: {e}")
                 flash("Error al actualizar la imagen.", "danger")
@@ -204,6 +409,7 @@ def edit_book(book_id):
         book.stock = form.stock.data
         book.description = form.description.data
         db.session.commit()
+        invalidate_categories()
         flash('Libro actualizado.', 'success')
         return redirect(url_for('admin_books'))
     return render_template('edit_book.html', form=form, action='Editar', book=book)
@@ -219,8 +425,10 @@ def delete_book(book_id):
         flash("⚠️ No puedes eliminar este libro porque tiene pedidos registrados.", "warning")
         return redirect(url_for('admin_books'))
 
+    StockReservation.query.filter_by(book_id=book.id).delete()
     db.session.delete(book)
     db.session.commit()
+    invalidate_categories()
     flash("✅ Libro eliminado correctamente.", "success")
     return redirect(url_for('admin_books'))
 
@@ -230,8 +438,13 @@ def delete_book(book_id):
 @login_required
 @admin_required
 def admin_users():
-    users = User.query.all()
-    return render_template('admin_users.html', users=users)
+    query = request.args.get('q', '').strip()
+    users_q = User.query
+    if query:
+        # Prefijo de usuario o email, con los índices sobre lower()
+        users_q = users_q.filter(or_(prefix_filter(User.username, query), prefix_filter(User.email, query)))
+    users = keyset_paginate(users_q, User.id, app.config['PAGE_SIZE'])
+    return render_template('admin_users.html', users=users, query=query)
 
 
 @app.route('/admin/users/add', methods=['GET', 'POST'])
@@ -263,6 +476,7 @@ def admin_edit_user(user_id):
         user.email = request.form['email']
         user.role = request.form['role']
         db.session.commit()
+        invalidate_identity(user.id)
         flash('✅ Usuario actualizado correctamente.', 'success')
         return redirect(url_for('admin_users'))
     return render_template('edit_user.html', user=user)
@@ -279,6 +493,7 @@ def admin_delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_identity(user_id)
     flash('🗑️ Usuario eliminado correctamente.', 'success')
     return redirect(url_for('admin_users'))
 
@@ -291,36 +506,34 @@ def catalogo():
     selected_category = request.args.get('category', '').strip()
 
     books_q = Book.query
-    if query:
-        books_q = books_q.filter(
-            (Book.title.ilike(f'%{query}%')) |
-            (Book.author.ilike(f'%{query}%'))
-        )
     if selected_category:
         books_q = books_q.filter(Book.category == selected_category)
 
-    books = books_q.order_by(Book.id.desc()).all()
+    if query:
+        # Búsqueda indexada y ordenada por relevancia (ver search.py).
+        # No se pagina: se muestran los SEARCH_RESULTS_LIMIT más relevantes.
+        books = search_books(books_q, query, limit=app.config['SEARCH_RESULTS_LIMIT']).all()
+    else:
+        books = keyset_paginate(books_q, Book.id, app.config['PAGE_SIZE'])
+    # Unidades apartadas en carritos (se muestran como no disponibles)
+    reserved = reserved_quantities([b.id for b in books])
 
     # Obtener lista de categorías existentes (no nulas)
-    categories = [c[0] for c in db.session.query(Book.category).filter(Book.category != None).distinct().order_by(Book.category).all()]
+    categories = get_categories()
 
-    # Recomendaciones basadas en las 2 categorías favoritas del usuario (solo para usuarios normales)
-    recommended_books = []
+    # Recomendaciones precalculadas (co-compras + favoritas), solo para usuarios normales
+    recommended = []
     if current_user.is_authenticated and not getattr(current_user, 'is_admin', False):
-        fav1 = getattr(current_user, 'fav_category1', None)
-        fav2 = getattr(current_user, 'fav_category2', None)
-        favs = [c for c in (fav1, fav2) if c]
-        if favs:
-            recommended_books = Book.query.filter(Book.category.in_(favs)).order_by(Book.id.desc()).limit(8).all()
+        recommended = recommended_books(current_user, max_age=app.config['RECOMMENDATION_TTL'])
 
-    return render_template('catalogo.html', books=books, query=query, categories=categories, selected_category=selected_category, recommended_books=recommended_books)
+    return render_template('catalogo.html', books=books, query=query, categories=categories, selected_category=selected_category, recommended_books=recommended, reserved=reserved)
 
 
 @app.route('/select-favs', methods=['GET', 'POST'])
 @login_required
 def select_favs():
     # Obtener categorías disponibles
-    categories = [c[0] for c in db.session.query(Book.category).filter(Book.category != None).distinct().order_by(Book.category).all()]
+    categories = get_categories()
 
     # Si es admin, no necesita seleccionar preferencias
     if current_user.is_authenticated and getattr(current_user, 'is_admin', False):
@@ -333,9 +546,12 @@ def select_favs():
             flash('Por favor selecciona exactamente 2 categorías.', 'warning')
             return render_template('select_favs.html', categories=categories)
 
-        current_user.fav_category1 = selected[0]
-        current_user.fav_category2 = selected[1]
+        user = current_user.load()
+        user.fav_category1 = selected[0]
+        user.fav_category2 = selected[1]
+        invalidate_user(user.id)
         db.session.commit()
+        invalidate_identity(user.id)
         flash('✅ Preferencias guardadas.', 'success')
         return redirect(url_for('catalogo'))
 
@@ -349,7 +565,7 @@ def select_favs():
 @app.route('/cart')
 @login_required
 def view_cart():
-    cart = current_user.cart
+    cart = Cart.query.filter_by(user_id=current_user.id).first()
     if not cart:
         cart = Cart(user_id=current_user.id)
         db.session.add(cart)
@@ -369,19 +585,25 @@ def add_to_cart(book_id):
         flash('Cantidad inválida.', 'warning')
         return redirect(url_for('catalogo'))
 
-    if book.stock < qty:
-        flash('No hay suficiente stock disponible.', 'danger')
-        return redirect(url_for('catalogo'))
-
-    cart = current_user.cart
+    cart = Cart.query.filter_by(user_id=current_user.id).first()
     if not cart:
         cart = Cart(user_id=current_user.id)
         db.session.add(cart)
         db.session.commit()
 
+    # Disponible = stock - reservas activas de otros carritos. Se bloquea el
+    # libro para que dos carritos no reserven las mismas unidades a la vez.
+    begin_write()
+    available = available_stock(book.id, cart.id, lock=True)
+    if available < qty:
+        db.session.rollback()
+        flash('No hay suficiente stock disponible.', 'danger')
+        return redirect(url_for('catalogo'))
+
     item = CartItem.query.filter_by(cart_id=cart.id, book_id=book.id).first()
     if item:
-        if book.stock < item.quantity + qty:
+        if available < item.quantity + qty:
+            db.session.rollback()
             flash('No hay suficiente stock para aumentar la cantidad.', 'danger')
             return redirect(url_for('catalogo'))
         item.quantity += qty
@@ -389,6 +611,7 @@ def add_to_cart(book_id):
         item = CartItem(cart_id=cart.id, book_id=book.id, quantity=qty)
         db.session.add(item)
 
+    reserve(cart, book.id, item.quantity)
     db.session.commit()
     flash(f'✅ Añadido {qty} x "{book.title}" al carrito.', 'success')
     return redirect(url_for('catalogo'))
@@ -397,7 +620,7 @@ def add_to_cart(book_id):
 @app.route('/cart/remove/<int:item_id>', methods=['POST'])
 @login_required
 def remove_from_cart(item_id):
-    cart = current_user.cart
+    cart = Cart.query.filter_by(user_id=current_user.id).first()
     if not cart:
         flash("No tienes un carrito activo.", "warning")
         return redirect(url_for('catalogo'))
@@ -409,9 +632,11 @@ def remove_from_cart(item_id):
 
     if item.quantity > 1:
         item.quantity -= 1
+        reserve(cart, item.book_id, item.quantity)
         flash(f"Se eliminó una unidad de '{item.book.title}'.", "info")
     else:
         db.session.delete(item)
+        reserve(cart, item.book_id, 0)
         flash(f"'{item.book.title}' fue eliminado del carrito.", "success")
 
     db.session.commit()
@@ -421,33 +646,40 @@ def remove_from_cart(item_id):
 @app.route('/checkout', methods=['POST', 'GET'])
 @login_required
 def checkout():
-    cart = current_user.cart
+    cart = Cart.query.filter_by(user_id=current_user.id).first()
     if not cart or len(cart.items) == 0:
         flash('El carrito está vacío.', 'warning')
         return redirect(url_for('catalogo'))
 
-    # Validar stock
-    for item in cart.items:
-        if item.book.stock < item.quantity:
-            flash(f'No hay suficiente stock para "{item.book.title}".', 'danger')
+    # Crear pedido en una sola transacción. El stock se descuenta con UPDATE
+    # condicionales (ver inventory.py), así dos compras simultáneas no pueden
+    # vender más unidades de las que hay.
+    try:
+        begin_write()
+        missing = take_stock(quantities_of(cart.items), cart_id=cart.id)
+        if missing is not None:
+            db.session.rollback()
+            book = db.session.get(Book, missing)
+            flash(f'No hay suficiente stock para "{book.title}".', 'danger')
             return redirect(url_for('view_cart'))
 
-    # Crear pedido
-    try:
         order = Order(user_id=current_user.id, status='created', total=0.0)
         db.session.add(order)
         db.session.flush()
 
         total = 0.0
         for item in cart.items:
-            item.book.stock -= item.quantity
             price = item.book.price or 0.0
             order_item = OrderItem(order_id=order.id, book_id=item.book_id, quantity=item.quantity, price=price)
             db.session.add(order_item)
             total += price * item.quantity
             db.session.delete(item)
 
+        # El stock ya se descontó: las reservas del carrito dejan de hacer falta
+        release(cart.id)
         order.total = total
+        # Un pedido 'created' todavía no es venta: los resúmenes no cambian hasta el pago
+        update_rollups(order, None)
         db.session.commit()
         flash('✅ Pedido creado correctamente.', 'success')
         return redirect(url_for('payment'))
@@ -465,14 +697,14 @@ def checkout():
 @app.route('/orders')
 @login_required
 def view_orders():
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.id.desc()).all()
+    orders = keyset_paginate(Order.query.filter_by(user_id=current_user.id), Order.id, app.config['PAGE_SIZE'])
     return render_template('orders.html', orders=orders)
 
 
 @app.route('/orders/<int:order_id>')
 @login_required
 def view_order(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(*ORDER_DETAIL_OPTIONS).get_or_404(order_id)
     if order.user_id != current_user.id:
         flash('Acceso denegado.', 'danger')
         return redirect(url_for('view_orders'))
@@ -483,7 +715,7 @@ def view_order(order_id):
 @login_required
 def cancel_order(order_id):
     """Permite al usuario cancelar su pedido"""
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(selectinload(Order.items)).get_or_404(order_id)
 
     # Verificar que el pedido pertenezca al usuario
     if order.user_id != current_user.id:
@@ -495,13 +727,27 @@ def cancel_order(order_id):
         flash(f'No puedes cancelar un pedido en estado "{order.status}".', 'warning')
         return redirect(url_for('view_order', order_id=order_id))
 
-    # Restaurar el stock de los libros
-    for item in order.items:
-        item.book.stock += item.quantity
+    # Cambiar estado a cancelado solo si nadie lo cambió mientras tanto
+    # (evita restaurar el stock dos veces con cancelaciones simultáneas)
+    old_status = order.status
+    begin_write()
+    changed = db.session.execute(
+        Order.__table__.update()
+        .where(Order.id == order.id, Order.status == old_status)
+        .values(status='cancelled')
+    ).rowcount
+    if changed != 1:
+        db.session.rollback()
+        flash('El pedido cambió de estado, intenta de nuevo.', 'warning')
+        return redirect(url_for('view_order', order_id=order_id))
 
-    # Cambiar estado a cancelado
+    # Restaurar el stock de los libros
+    return_stock(quantities_of(order.items))
     order.status = 'cancelled'
+    on_order_status_change(order, old_status)
+    update_rollups(order, old_status)
     db.session.commit()
+    issue_invoice(order)
 
     flash('✅ Pedido cancelado correctamente. El stock ha sido restaurado.', 'success')
     return redirect(url_for('view_order', order_id=order_id))
@@ -513,14 +759,70 @@ def cancel_order(order_id):
 @admin_required
 def admin_orders():
     """Ver todos los pedidos de usuarios no-admin"""
-    # Obtener todos los usuarios que NO son admins
-    non_admin_users = User.query.filter_by(role='user').all()
-    user_ids = [user.id for user in non_admin_users]
-    
-    # Obtener todos los pedidos de esos usuarios
-    orders = Order.query.filter(Order.user_id.in_(user_ids)).order_by(Order.id.desc()).all()
-    
-    return render_template('admin_orders.html', orders=orders)
+    status = request.args.get('status', '').strip()
+    date_from = parse_date(request.args.get('from'))
+    date_to = parse_date(request.args.get('to'))
+
+    # Una sola consulta: pedidos JOIN usuarios no-admin, cargando solo las
+    # columnas del usuario que muestra la tabla
+    orders_q = Order.query.join(Order.user).filter(User.role == 'user').options(
+        contains_eager(Order.user).load_only(User.id, User.username, User.email, User.role)
+    )
+    if status in ORDER_STATUSES:
+        orders_q = orders_q.filter(Order.status == status)
+    if date_from:
+        orders_q = orders_q.filter(Order.created_at >= date_from)
+    if date_to:
+        orders_q = orders_q.filter(Order.created_at < date_to + timedelta(days=1))
+
+    orders = keyset_paginate(orders_q, Order.id, app.config['PAGE_SIZE'])
+    return render_template('admin_orders.html', orders=orders, statuses=ORDER_STATUSES,
+                           status=status, date_from=request.args.get('from', ''), date_to=request.args.get('to', ''))
+
+
+# --- INFORMES DE VENTAS (ver reports.py) ---
+REPORT_DEFAULT_DAYS = 30
+
+
+def report_range():
+    """Rango ``[start, end)`` de los parámetros from/to (por defecto, los últimos 30 días, en UTC)."""
+    today = utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = parse_date(request.args.get('to')) or today
+    start = parse_date(request.args.get('from')) or end - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    return start, end + timedelta(days=1)
+
+
+@app.route('/admin/reports')
+@login_required
+@admin_required
+def admin_reports():
+    """Ingresos por día, categoría y libro, más vendidos y embudo de estados"""
+    start, end = report_range()
+    execute = db.session.execute
+    return render_template(
+        'admin_reports.html',
+        by_day=execute(reports.revenue_by_day(start, end)).all(),
+        by_category=execute(reports.revenue_by_category(start, end)).all(),
+        top_sellers=execute(reports.top_sellers(start, end)).all(),
+        top_revenue=execute(reports.revenue_by_book(start, end, limit=reports.TOP_SELLERS)).all(),
+        funnel=reports.status_funnel(start, end),
+        date_from=start.strftime('%Y-%m-%d'),
+        date_to=(end - timedelta(days=1)).strftime('%Y-%m-%d'),
+    )
+
+
+@app.route('/admin/reports/<name>.csv')
+@login_required
+@admin_required
+def admin_report_csv(name):
+    """Descarga un informe en CSV, generado por partes (``orders``: todos los ítems del rango)"""
+    if name not in reports.CSV_REPORTS:
+        abort(404)
+    start, end = report_range()
+    query = reports.CSV_REPORTS[name](start, end)
+    filename = f"informe-{name}-{start:%Y%m%d}-{end - timedelta(days=1):%Y%m%d}.csv"
+    return Response(stream_with_context(reports.stream_csv(query)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 
 @app.route('/admin/orders/<int:order_id>')
@@ -528,7 +830,7 @@ def admin_orders():
 @admin_required
 def admin_view_order(order_id):
     """Ver detalles de un pedido de usuario (solo admin)"""
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(*ORDER_DETAIL_OPTIONS).get_or_404(order_id)
     
     # Verificar que el pedido sea de un usuario no-admin
     if order.user.is_admin:
@@ -543,7 +845,7 @@ def admin_view_order(order_id):
 @admin_required
 def admin_update_order_status(order_id):
     """Actualizar el estado de un pedido de usuario"""
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(joinedload(Order.user), selectinload(Order.items)).get_or_404(order_id)
     
     # Verificar que el pedido sea de un usuario no-admin
     if order.user.is_admin:
@@ -551,14 +853,30 @@ def admin_update_order_status(order_id):
         return redirect(url_for('admin_orders'))
     
     new_status = request.form.get('status', '').strip()
-    valid_statuses = ['created', 'paid', 'shipped', 'delivered', 'cancelled']
     
-    if new_status not in valid_statuses:
-        flash(f'Estado inválido. Debe ser uno de: {", ".join(valid_statuses)}', 'danger')
+    if new_status not in ORDER_STATUSES:
+        flash(f'Estado inválido. Debe ser uno de: {", ".join(ORDER_STATUSES)}', 'danger')
         return redirect(url_for('admin_view_order', order_id=order_id))
     
+    # Solo si nadie lo cambió mientras tanto: los resúmenes de ventas y las
+    # recomendaciones suman o restan el pedido una sola vez por transición
+    old_status = order.status
+    begin_write()
+    changed = db.session.execute(
+        Order.__table__.update()
+        .where(Order.id == order.id, Order.status == old_status)
+        .values(status=new_status)
+    ).rowcount
+    if changed != 1:
+        db.session.rollback()
+        flash('El pedido cambió de estado, intenta de nuevo.', 'warning')
+        return redirect(url_for('admin_view_order', order_id=order_id))
+
     order.status = new_status
+    on_order_status_change(order, old_status)
+    update_rollups(order, old_status)
     db.session.commit()
+    issue_invoice(order)
     
     flash(f'✅ Estado del pedido actualizado a "{new_status}".', 'success')
     return redirect(url_for('admin_view_order', order_id=order_id))
@@ -596,10 +914,22 @@ def payment():
         request.form.get('expiry_date')
         request.form.get('cvv')
 
-        # Marcar el pedido como pagado
+        # Marcar el pedido como pagado (una sola vez si llegan dos POST a la vez)
         if order:
-            order.status = 'paid'
-            db.session.commit()
+            begin_write()
+            changed = db.session.execute(
+                Order.__table__.update()
+                .where(Order.id == order.id, Order.status == 'created')
+                .values(status='paid')
+            ).rowcount
+            if changed == 1:
+                order.status = 'paid'
+                on_order_status_change(order, 'created')
+                update_rollups(order, 'created')
+                db.session.commit()
+                issue_invoice(order)
+            else:
+                db.session.rollback()
         flash('✅ Pago procesado correctamente. ¡Gracias por tu compra!', 'success')
         return redirect(url_for('catalogo'))  # O una página de confirmación
 
@@ -611,7 +941,7 @@ def payment():
 @login_required
 def view_invoice(order_id):
     """Muestra la factura del pedido"""
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(*ORDER_DETAIL_OPTIONS).get_or_404(order_id)
     
     # Verificar que el pedido pertenezca al usuario actual o que sea admin
     if order.user_id != current_user.id and not current_user.is_admin:
@@ -621,8 +951,191 @@ def view_invoice(order_id):
     return render_template('invoice.html', order=order, now=datetime.now())
 
 
+@app.route('/invoice/<int:order_id>.pdf')
+@login_required
+def invoice_pdf(order_id):
+    """Descarga la factura en PDF (generada al pagar; ver invoices.py)"""
+    order = Order.query.options(*ORDER_DETAIL_OPTIONS).get_or_404(order_id)
+
+    if order.user_id != current_user.id and not current_user.is_admin:
+        flash('Acceso restringido.', 'danger')
+        return redirect(url_for('view_orders'))
+
+    path = stored_invoice_path(order)
+    if path is None:
+        if expected_kind(order) is None:
+            flash('La factura en PDF estará disponible cuando el pedido esté pagado.', 'warning')
+            return redirect(url_for('view_invoice', order_id=order_id))
+        # Pedido anterior a las facturas PDF o archivo perdido: se genera ahora
+        issue_invoice(order, force=True)
+        path = stored_invoice_path(order)
+        if path is None:
+            # El pedido cambió de estado mientras se generaba
+            flash('El pedido cambió de estado, intenta de nuevo.', 'warning')
+            return redirect(url_for('view_invoice', order_id=order_id))
+
+    # El hash del contenido es el ETag: las descargas repetidas reciben un 304
+    response = send_file(path, mimetype='application/pdf', download_name=f'factura-{order.id}.pdf',
+                         etag=order.invoice_hash, last_modified=order.invoice_rendered_at, conditional=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+# --- Comandos CLI ---
+@app.cli.command('rebuild-recommendations')
+def rebuild_recommendations_command():
+    """Recalcula desde cero las tablas de recomendaciones."""
+    rebuild_all()
+    print('Recomendaciones recalculadas.')
+
+
+@app.cli.command('rebuild-rollups')
+@click.option('--from', 'date_from', help='Fecha inicial YYYY-MM-DD (incluida); por defecto desde el principio')
+@click.option('--to', 'date_to', help='Fecha final YYYY-MM-DD (incluida); por defecto hasta hoy')
+def rebuild_rollups_command(date_from, date_to):
+    """Recalcula los resúmenes diarios de ventas desde los pedidos (ver rollups.py)."""
+    start, end = parse_date(date_from), parse_date(date_to)
+    if (date_from and not start) or (date_to and not end):
+        raise click.BadParameter('Las fechas deben tener el formato YYYY-MM-DD.')
+    t0 = time.perf_counter()
+    counts = rebuild_rollups(start.date() if start else None, (end + timedelta(days=1)).date() if end else None)
+    print(f'Filas: {counts} en {time.perf_counter() - t0:.1f} s')
+
+
+@app.cli.command('render-invoices')
+@click.option('--from', 'date_from', help='Fecha inicial YYYY-MM-DD (incluida)')
+@click.option('--to', 'date_to', help='Fecha final YYYY-MM-DD (incluida)')
+@click.option('--workers', type=int, default=None, help='Procesos (por defecto INVOICE_WORKERS)')
+@click.option('--force', is_flag=True, help='Regenerar también las facturas existentes')
+def render_invoices_command(date_from, date_to, workers, force):
+    """Genera en bloque las facturas PDF de un rango de fechas."""
+    start, end = parse_date(date_from), parse_date(date_to)
+    if (date_from and not start) or (date_to and not end):
+        raise click.BadParameter('Las fechas deben tener el formato YYYY-MM-DD.')
+    print(render_range(start, end + timedelta(days=1) if end else None, workers=workers, force=force))
+
+
+@app.cli.command('rehash-covers')
+def rehash_covers_command():
+    """Renombra las portadas subidas por su SHA-256 y actualiza los libros."""
+    result = rehash_uploads(db, Book)
+    print(f"Archivos renombrados: {result['files']} ({result['duplicates']} duplicados), "
+          f"libros actualizados: {result['books']}")
+    names = [name for (name,) in db.session.query(Book.cover_filename).filter(Book.cover_filename != None).distinct()]
+    print(f'Variantes generadas: {build_all(names)}')
+
+
+@app.cli.command('build-covers')
+def build_covers_command():
+    """Genera las variantes (miniatura/detalle, AVIF/WebP/JPEG) de todas las portadas."""
+    names = [name for (name,) in db.session.query(Book.cover_filename).filter(Book.cover_filename != None).distinct()]
+    print(f'Portadas procesadas: {build_all(names)} de {len(names)}')
+
+
+@app.cli.command('generate-data')
+@click.option('--books', default=0, help='Libros a generar')
+@click.option('--users', default=0, help='Usuarios a generar')
+@click.option('--orders', default=0, help='Pedidos a generar (con sus ítems)')
+@click.option('--batch-size', default=10_000, help='Filas por lote (un commit por lote)')
+@click.option('--days', default=730, help='Días hacia atrás en que se reparten los pedidos')
+@click.option('--skew', default=1.1, help='Exponente Zipf de la popularidad de libros')
+@click.option('--seed', default=1, help='Semilla (misma semilla = mismos datos)')
+@click.option('--defer-indexes', is_flag=True, help='Borrar los índices secundarios y recrearlos al final')
+def generate_data_command(books, users, orders, batch_size, days, skew, seed, defer_indexes):
+    """Genera datos sintéticos a gran escala (ver synthetic.py)."""
+    t0 = time.perf_counter()
+    counts = generate_data(books=books, users=users, orders=orders, batch_size=batch_size, days=days,
+                           skew=skew, seed=seed, defer_indexes=defer_indexes, progress=lambda msg: print(f'\r{msg}', end='', flush=True))
+    elapsed = time.perf_counter() - t0
+    print(f"\nFilas insertadas: {counts} en {elapsed:.1f} s ({sum(counts.values()) / elapsed:,.0f} filas/s)")
+    if orders:
+        print('Recalcula las recomendaciones con: flask --app app rebuild-recommendations')
+        print('y los resúmenes de ventas con: flask --app app rebuild-rollups')
+
+
+@app.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Por defecto según la extensión')
+@click.option('--batch-size', type=int, default=None, help='Filas por transacción (por defecto BOOK_IMPORT_BATCH_SIZE)')
+def import_books_command(path, fmt, batch_size):
+    """Importa libros desde un CSV o JSON Lines (ver catalog_io.py)."""
+    fmt = fmt or format_for(path)
+    if fmt is None:
+        raise click.UsageError('No se reconoce la extensión: indica --format csv o --format jsonl.')
+    t0 = time.perf_counter()
+    with open(path, 'rb') as f:
+        try:
+            result = import_books(f, fmt, batch_size=batch_size or app.config['BOOK_IMPORT_BATCH_SIZE'],
+                                  progress=lambda r: print(f'\r{r.rows:,} filas', end='', flush=True))
+        except CatalogFormatError as e:
+            raise click.ClickException(str(e))
+        finally:
+            invalidate_categories()
+    print(f'\r{result.summary()} en {time.perf_counter() - t0:.1f} s')
+    for line, message in result.errors:
+        print(f'  línea {line}: {message}')
+    if result.error_count > len(result.errors):
+        print(f'  ... y {result.error_count - len(result.errors):,} errores más')
+    if result.error_count:
+        raise SystemExit(1)
+
+
+@app.cli.command('export-books')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Archivo (por defecto la salida estándar)')
+def export_books_command(fmt, output):
+    """Exporta el catálogo completo en CSV o JSON Lines."""
+    for chunk in export_books(fmt):
+        output.write(chunk)
+
+
+@app.cli.command('bulk-update')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Por defecto según la extensión')
+@click.option('--batch-size', type=int, default=None, help='Filas por lote (por defecto BULK_UPDATE_BATCH_SIZE)')
+def bulk_update_command(path, fmt, batch_size):
+    """Aplica cambios de stock (stock_delta) y precio (price) por id desde un CSV o JSON Lines."""
+    fmt = fmt or format_for(path)
+    if fmt is None:
+        raise click.UsageError('No se reconoce la extensión: indica --format csv o --format jsonl.')
+    t0 = time.perf_counter()
+    with open(path, 'rb') as f:
+        try:
+            summary = apply_changes(read_rows(f, fmt, required=('id',)),
+                                    batch_size=batch_size or app.config['BULK_UPDATE_BATCH_SIZE'])
+        except CatalogFormatError as e:
+            raise click.ClickException(str(e))
+    print(f"{summary['rows']:,} filas en {summary['batches']:,} lotes: {summary['applied_batches']:,} aplicados "
+          f"({summary['updated']:,} libros), {summary['failed_batches']:,} rechazados, "
+          f"en {time.perf_counter() - t0:.1f} s")
+    for error in summary['errors']:
+        print(f"  lote {error['batch']}, línea {error['row']} (id {error['id']}): {error['error']}")
+    if summary['error_count'] > len(summary['errors']):
+        print(f"  ... y {summary['error_count'] - len(summary['errors']):,} errores más")
+    if summary['failed_batches']:
+        raise SystemExit(1)
+
+
+@app.cli.command('sweep-carts')
+@click.option('--loop', is_flag=True, help='Repetir cada RESERVATION_SWEEP_INTERVAL segundos (proceso dedicado)')
+def sweep_carts_command(loop):
+    """Borra reservas de stock vencidas y carritos inactivos."""
+    if not loop:
+        print(sweep())
+        return
+    interval = app.config['RESERVATION_SWEEP_INTERVAL']
+    if interval <= 0:
+        raise click.BadParameter('Con --loop, RESERVATION_SWEEP_INTERVAL debe ser mayor que 0.')
+    run_sweeper(app, interval)
+
+
 # --- Ejecutar aplicación ---
 if __name__ == '__main__':
+    # Los procesos del pool de contraseñas volverían a importar este archivo
+    # (y a armar la app): con el servidor de desarrollo se hashea en el hilo
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    init_passwords(app)
     app.run(debug=False)
 
 
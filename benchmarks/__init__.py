@@ -0,0 +1 @@
+"""Scripts de benchmark. Ejecutar desde la raíz: ``python -m benchmarks.<script>``."""
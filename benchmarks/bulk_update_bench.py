@@ -0,0 +1,92 @@
+"""Compara los cambios masivos de stock y precio con el camino libro por libro.
+
+- ``por fila``: lo que hace ``edit_book()``: carga el ``Book``, asigna los
+  campos y hace un commit por libro;
+- ``masivo``: ``inventory.apply_changes``, un ``UPDATE ... FROM (VALUES ...)``
+  por lote.
+
+Los dos aplican los mismos cambios (deltas de stock positivos y, en parte de
+las filas, un precio nuevo) sobre libros al azar.
+
+Uso:
+    python -m benchmarks.bulk_update_bench --books 100000 --changes 20000
+    python -m benchmarks.bulk_update_bench --database-url postgresql://... --batch-size 5000
+
+Sin ``--database-url`` se usa una base SQLite temporal.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def make_changes(total, books, seed=3):
+    rng = random.Random(seed)
+    changes = []
+    for _ in range(total):
+        change = {'id': rng.randint(1, books), 'stock_delta': rng.randint(1, 20)}
+        if rng.random() < 0.3:
+            change['price'] = round(rng.uniform(1, 60), 2)
+        changes.append(change)
+    return changes
+
+
+def per_row(db, Book, changes):
+    for change in changes:
+        book = db.session.get(Book, change['id'])
+        book.stock = book.stock + change['stock_delta']
+        if 'price' in change:
+            book.price = change['price']
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto SQLite temporal)')
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--changes', type=int, default=20_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'bulk_update_bench.sqlite3')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import app
+    from models import db, Book
+    from inventory import apply_changes
+    from benchmarks.seed import seed_books
+
+    with app.app_context():
+        if db.session.query(Book.id).count() < args.books:
+            seed_books(db, args.books)
+        changes = make_changes(args.changes, args.books)
+        total_stock = lambda: db.session.query(db.func.sum(Book.stock)).scalar()
+
+        print(f"{'camino':<10}{'cambios':>10}{'segundos':>10}{'cambios/s':>12}")
+        results = {}
+        for name, run in (
+            ('por fila', lambda: per_row(db, Book, changes)),
+            ('masivo', lambda: apply_changes(((n, c, None) for n, c in enumerate(changes, 1)),
+                                             batch_size=args.batch_size)),
+        ):
+            before = total_stock()
+            t0 = time.perf_counter()
+            summary = run()
+            elapsed = time.perf_counter() - t0
+            db.session.remove()
+            added = total_stock() - before
+            expected = sum(c['stock_delta'] for c in changes)
+            if added != expected or (summary and summary['failed_batches']):
+                raise SystemExit(f'{name}: el stock sumó {added}, se esperaba {expected}')
+            results[name] = elapsed
+            print(f'{name:<10}{len(changes):>10,}{elapsed:>10.2f}{len(changes) / elapsed:>12,.0f}')
+
+        print(f"\nMasivo {results['por fila'] / results['masivo']:.1f}x más rápido (lotes de {args.batch_size})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Prueba de estrés de checkout concurrente: el stock nunca debe quedar negativo.
+
+Crea un libro con poco stock y muchos compradores que intentan comprarlo a la
+vez (un hilo y un cliente de pruebas de Flask por comprador). Al final verifica
+que el stock no es negativo y que las unidades vendidas más el stock restante
+suman el stock inicial.
+
+Uso:
+    python -m benchmarks.checkout_stress --buyers 40 --stock 25 --qty 2
+    python -m benchmarks.checkout_stress --database-url postgresql://...
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto SQLite temporal)')
+    parser.add_argument('--buyers', type=int, default=40)
+    parser.add_argument('--stock', type=int, default=25)
+    parser.add_argument('--qty', type=int, default=2, help='Unidades que compra cada comprador')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'checkout_stress.sqlite3')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import app
+    from models import db, User, Book, OrderItem
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    password = 'stress-pass'
+    failures = 0
+
+    for round_no in range(1, args.rounds + 1):
+        with app.app_context():
+            book = Book(title=f'Stress {round_no}', author='Bench', price=10.0, stock=args.stock)
+            db.session.add(book)
+            users = []
+            for i in range(args.buyers):
+                user = User(username=f'stress{round_no}_{i}', email=f'stress{round_no}_{i}@example.com')
+                user.set_password(password)
+                users.append(user)
+            db.session.add_all(users)
+            db.session.commit()
+            book_id, emails = book.id, [u.email for u in users]
+
+        barrier = threading.Barrier(len(emails))
+        errors = []
+
+        def buyer(email):
+            try:
+                client = app.test_client()
+
+                def post(url, **data):
+                    response = client.post(url, data=data)
+                    if response.status_code >= 500:
+                        raise RuntimeError(f'{url} -> {response.status_code}')
+
+                post('/login', email=email, password=password)
+                post(f'/cart/add/{book_id}', quantity=1)
+                if args.qty > 1:
+                    post(f'/cart/add/{book_id}', quantity=args.qty - 1)
+                barrier.wait()
+                post('/checkout')
+            except Exception as e:  # noqa: BLE001 - se reporta al final
+                errors.append(e)
+
+        threads = [threading.Thread(target=buyer, args=(e,)) for e in emails]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        with app.app_context():
+            stock = db.session.get(Book, book_id).stock
+            sold = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+                             .filter(OrderItem.book_id == book_id).scalar()
+
+        ok = stock >= 0 and sold + stock == args.stock and not errors
+        failures += not ok
+        print(f"ronda {round_no}: stock inicial={args.stock} vendido={sold} restante={stock} "
+              f"errores={len(errors)} tiempo={elapsed:.2f}s -> {'OK' if ok else 'FALLO'}")
+        for e in errors[:3]:
+            print(f"  {type(e).__name__}: {e}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
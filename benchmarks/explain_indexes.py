@@ -0,0 +1,139 @@
+"""Planes de ejecución (EXPLAIN) de las consultas calientes, sin y con índices.
+
+Carga un dataset sintético, borra los índices de la migración
+``e3d5a0c9b812`` (hot lookup paths), muestra el plan y la latencia de cada
+consulta, vuelve a crear los índices y repite.
+
+Uso:
+    python -m benchmarks.explain_indexes --books 50000 --users 20000 --orders 100000
+    python -m benchmarks.explain_indexes --database-url postgresql://...
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+
+INDEXES = [
+    ('cart_items', 'uq_cart_items_cart_book'),
+    ('order_items', 'ix_order_items_book_id'),
+    ('order_items', 'ix_order_items_order_id'),
+    ('books', 'ix_books_category'),
+    ('orders', 'ix_orders_user_id_status_id'),
+]
+
+# (nombre, SQL, parámetros) — las mismas formas que generan las vistas
+QUERIES = [
+    ('add_to_cart: ítem del carrito',
+     'SELECT * FROM cart_items WHERE cart_id = :cart_id AND book_id = :book_id LIMIT 1', 'cart_book'),
+    ('delete_book: ¿tiene pedidos?',
+     'SELECT id FROM order_items WHERE book_id = :book_id LIMIT 1', 'book'),
+    ('catalogo: filtro por categoría',
+     'SELECT * FROM books WHERE category = :category ORDER BY id DESC LIMIT 25', 'category'),
+    ('categorías (DISTINCT)',
+     'SELECT DISTINCT category FROM books WHERE category IS NOT NULL ORDER BY category', None),
+    ('payment: último pedido created',
+     "SELECT * FROM orders WHERE user_id = :user_id AND status = 'created' ORDER BY id DESC LIMIT 1", 'user'),
+    ('detalle: ítems del pedido',
+     'SELECT * FROM order_items WHERE order_id = :order_id', 'order'),
+]
+
+
+def sample_params(conn):
+    cart_id, book_id = conn.execute(text('SELECT cart_id, book_id FROM cart_items ORDER BY id DESC LIMIT 1')).one()
+    return {
+        'cart_book': {'cart_id': cart_id, 'book_id': book_id},
+        'book': {'book_id': conn.execute(text('SELECT MAX(id) FROM books')).scalar()},
+        'category': {'category': conn.execute(text('SELECT category FROM books LIMIT 1')).scalar()},
+        'user': {'user_id': conn.execute(text('SELECT user_id FROM orders ORDER BY id DESC LIMIT 1')).scalar()},
+        'order': {'order_id': conn.execute(text('SELECT MAX(order_id) FROM order_items')).scalar()},
+    }
+
+
+def explain(conn, dialect, sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+    rows = conn.execute(text(prefix + sql), params).all()
+    return [r[-1] for r in rows]
+
+
+def timed(conn, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(text(sql), params).all()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def report(conn, dialect, params, repeat, label):
+    print(f"\n=== {label} ===")
+    results = {}
+    for name, sql, key in QUERIES:
+        p = params[key] if key else {}
+        ms = timed(conn, sql, p, repeat)
+        results[name] = ms
+        print(f"\n{name}  ({ms:.3f} ms)")
+        for line in explain(conn, dialect, sql, p):
+            print(f"    {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto SQLite temporal)')
+    parser.add_argument('--books', type=int, default=50_000)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--carts', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'explain_indexes.sqlite3')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import app
+    from models import db, Order
+    from benchmarks import seed
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        seed.seed_books(db, args.books)
+        seed.seed_users(db, args.users)
+        if Order.query.count() == 0:
+            seed.seed_orders(db, args.orders)
+        seed.seed_carts(db, args.carts)
+        print(f"Dataset listo en {time.perf_counter() - t0:.1f}s")
+
+        engine = db.engine
+        dialect = engine.dialect.name
+        tables = db.metadata.tables
+        indexes = [next(i for i in tables[t].indexes if i.name == name) for t, name in INDEXES]
+
+        with engine.begin() as conn:
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+            conn.execute(text('ANALYZE'))
+        with engine.connect() as conn:
+            params = sample_params(conn)
+            before = report(conn, dialect, params, args.repeat, 'SIN índices')
+
+        with engine.begin() as conn:
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+            conn.execute(text('ANALYZE'))
+        with engine.connect() as conn:
+            after = report(conn, dialect, params, args.repeat, 'CON índices')
+
+        print(f"\n{'consulta':<34}{'sin (ms)':>10}{'con (ms)':>10}{'mejora':>9}")
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f"{name:<34}{before[name]:>10.3f}{after[name]:>10.3f}{speedup:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
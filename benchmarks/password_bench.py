@@ -0,0 +1,112 @@
+"""Throughput de login con distintos tamaños del pool de contraseñas.
+
+Para cada tamaño de pool (``PASSWORD_HASH_WORKERS``; 0 = en el mismo hilo)
+lanza ``--concurrency`` clientes que hacen login en paralelo y mide logins por
+segundo, latencia p50/p95 y cuántos fueron rechazados por el pool saturado
+(503 → redirección con ``Retry-After``).
+
+Uso:
+    python -m benchmarks.password_bench --pools 0,1,2,4 --logins 200 --concurrency 16
+    python -m benchmarks.password_bench --method pbkdf2:sha256:600000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def run(app, emails, password, logins, concurrency):
+    lock = threading.Lock()
+    remaining = [logins]
+    latencies, busy, errors = [], [0], [0]
+
+    def worker(n):
+        client = app.test_client()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                i = remaining[0]
+            t0 = time.perf_counter()
+            response = client.post('/login', data={'email': emails[i % len(emails)], 'password': password})
+            elapsed = time.perf_counter() - t0
+            client.get('/logout')
+            with lock:
+                if response.status_code == 302 and response.headers['Location'] == '/':
+                    latencies.append(elapsed)
+                elif 'Retry-After' in response.headers:
+                    busy[0] += 1
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return wall, sorted(latencies), busy[0], errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto SQLite temporal)')
+    parser.add_argument('--pools', default='0,1,2,4', help='Tamaños de pool separados por comas')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--method', help='PASSWORD_HASH_METHOD (por defecto el configurado)')
+    parser.add_argument('--max-pending', type=int, default=0, help='PASSWORD_HASH_MAX_PENDING (0 = 2 por proceso)')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'password_bench.sqlite3')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    if args.method:
+        os.environ['PASSWORD_HASH_METHOD'] = args.method
+
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from models import db, User
+    from passwords import init_passwords, hasher
+    from benchmarks import seed
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        seed.seed_users(db, args.users, prefix='pwbench')
+        # Mismo hash para todos, con el método configurado (sin rehash en el login)
+        password_hash = generate_password_hash(seed.PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+        db.session.execute(db.update(User).where(User.email.like('pwbench%')).values(password_hash=password_hash))
+        db.session.commit()
+        emails = [e for (e,) in db.session.query(User.email).filter(User.email.like('pwbench%'))]
+
+    print(f"Método: {app.config['PASSWORD_HASH_METHOD']}  logins: {args.logins}  "
+          f"concurrencia: {args.concurrency}  CPUs: {os.cpu_count()}")
+    print(f"{'pool':>5}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'503':>6}{'errores':>9}")
+    for size in [int(p) for p in args.pools.split(',')]:
+        app.config['PASSWORD_HASH_WORKERS'] = size
+        app.config['PASSWORD_HASH_MAX_PENDING'] = args.max_pending
+        init_passwords(app)
+        with app.app_context():
+            # Arranca los procesos antes de medir
+            for _ in range(size):
+                hasher().verify(password_hash, 'x')
+
+        wall, latencies, busy, errors = run(app, emails, seed.PASSWORD, args.logins, args.concurrency)
+        p50 = statistics.median(latencies) * 1000 if latencies else 0
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0
+        print(f"{size:>5}{len(latencies) / wall:>10.1f}{p50:>9.1f}{p95:>9.1f}{busy:>6}{errors:>9}")
+
+    with app.app_context():
+        hasher().shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Compara la latencia de la búsqueda del catálogo: ILIKE vs índice (FTS5/tsvector).
+
+Uso:
+    python -m benchmarks.search_bench --books 100000
+    python -m benchmarks.search_bench --database-url postgresql://... --books 200000
+
+Sin ``--database-url`` se usa una base SQLite temporal.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+QUERIES = ['corazón', 'corazon', 'cancion noche', 'garcia', 'princ', 'poesia', 'zzz']
+
+
+def time_query(build, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = build().all()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return len(rows), statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto SQLite temporal)')
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'search_bench.sqlite3')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    # Importar la app después de fijar DATABASE_URL (crea tablas e índice)
+    from app import app
+    from models import db, Book
+    import search
+    from benchmarks.seed import seed_books
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        inserted = seed_books(db, args.books)
+        print(f"Backend de búsqueda: {search._backend or 'ILIKE'}")
+        print(f"Libros insertados: {inserted} ({time.perf_counter() - t0:.1f}s), total: {args.books}\n")
+
+        limit = app.config['SEARCH_RESULTS_LIMIT']
+        print(f"{'consulta':<18}{'ruta':<8}{'filas':>7}{'media ms':>11}{'p95 ms':>10}")
+        for q in QUERIES:
+            for name, build in (
+                ('ilike', lambda: search.ilike_search(Book.query, q)),
+                ('indice', lambda: search.search_books(Book.query, q, limit=limit)),
+            ):
+                n, mean, p95 = time_query(build, args.repeat)
+                print(f"{q:<18}{name:<8}{n:>7}{mean:>11.2f}{p95:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
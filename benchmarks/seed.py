@@ -0,0 +1,145 @@
+"""Datos sintéticos para los benchmarks, insertados en bloque (sin ORM por fila).
+
+Todas las funciones reciben el ``db`` de la app y trabajan dentro de un app context.
+"""
+import random
+from datetime import timedelta
+
+from werkzeug.security import generate_password_hash
+
+from models import User, Book, Cart, CartItem, Order, OrderItem, utcnow
+
+WORDS = [
+    'amor', 'canción', 'corazón', 'noche', 'ciudad', 'río', 'montaña', 'guerra',
+    'memoria', 'sombra', 'jardín', 'invierno', 'océano', 'príncipe', 'acuerdo',
+    'crónica', 'silencio', 'espejo', 'tiempo', 'camino', 'historia', 'fuego',
+    'piedra', 'viento', 'luz', 'sueño', 'isla', 'lágrima', 'reino', 'árbol',
+]
+AUTHORS = ['García', 'Martínez', 'López', 'Muñoz', 'Sánchez', 'Pérez', 'Gómez', 'Díaz']
+CATEGORIES = ['Novela', 'Poesía', 'Ensayo', 'Historia', 'Ciencia', 'Infantil', 'Autoayuda']
+SYLLABLES = ['ca', 'lo', 'mi', 'ra', 'te', 'su', 'ven', 'dor', 'bli', 'ño', 'quí', 'sal']
+STATUSES = ['created', 'paid', 'paid', 'shipped', 'delivered', 'delivered', 'cancelled']
+
+# Un solo hash compartido por todos los usuarios sintéticos (hashear por
+# usuario dominaría el tiempo de carga)
+PASSWORD = 'benchmark'
+PASSWORD_HASH = generate_password_hash(PASSWORD)
+
+
+def category_names(total):
+    """Las ``total`` primeras categorías; si no alcanzan se inventan más."""
+    return CATEGORIES[:total] + [f'Categoría {i}' for i in range(len(CATEGORIES) + 1, total + 1)]
+
+
+def vocabulary(rng, size=5000):
+    """Palabras inventadas para que las descripciones tengan un vocabulario realista."""
+    return list({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)})
+
+
+def _insert(db, model, rows):
+    if rows:
+        db.session.execute(db.insert(model), rows)
+        db.session.commit()
+
+
+def _reset_sequence(db, model):
+    """Tras insertar ids explícitos, mueve la secuencia del id al máximo (PostgreSQL).
+
+    Si no, los INSERT de la app (p. ej. ``/checkout``) toman ids que ya existen.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    table = model.__tablename__
+    db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                               f"COALESCE((SELECT MAX(id) FROM {table}), 1))"))
+    db.session.commit()
+
+
+def _batches(total, batch):
+    for start in range(0, total, batch):
+        yield start, min(batch, total - start)
+
+
+def seed_books(db, total, batch=5000, seed=42, categories=CATEGORIES, stock=(0, 50)):
+    """Inserta libros hasta tener ``total`` filas. Devuelve cuántos insertó."""
+    existing = db.session.query(Book).count()
+    rng = random.Random(seed + existing)
+    vocab = vocabulary(rng)
+    for _, size in _batches(max(total - existing, 0), batch):
+        _insert(db, Book, [{
+            'title': ' '.join(rng.sample(WORDS, 3)).capitalize(),
+            'author': f'{rng.choice(AUTHORS)} {rng.choice(AUTHORS)}',
+            'price': round(rng.uniform(5, 80), 2),
+            'stock': rng.randint(*stock),
+            'description': ' '.join(rng.choices(vocab, k=18) + rng.choices(WORDS, k=2)),
+            'category': rng.choice(categories),
+        } for _ in range(size)])
+    return max(total - existing, 0)
+
+
+def seed_users(db, total, batch=5000, prefix='bench', categories=CATEGORIES):
+    """Inserta usuarios ``<prefix><n>@example.com`` (contraseña ``PASSWORD``)."""
+    existing = db.session.query(User).filter(User.email.like(f'{prefix}%@example.com')).count()
+    rng = random.Random(existing)
+    for start, size in _batches(max(total - existing, 0), batch):
+        _insert(db, User, [{
+            'username': f'{prefix}{existing + start + i}',
+            'email': f'{prefix}{existing + start + i}@example.com',
+            'password_hash': PASSWORD_HASH,
+            'role': 'user',
+            'fav_category1': rng.choice(categories),
+            'fav_category2': rng.choice(categories),
+        } for i in range(size)])
+    return max(total - existing, 0)
+
+
+def seed_orders(db, total, items_per_order=3, batch=2000, seed=7, days=365):
+    """Inserta ``total`` pedidos con sus ítems para usuarios y libros existentes."""
+    user_ids = [i for (i,) in db.session.query(User.id)]
+    book_rows = db.session.query(Book.id, Book.price).all()
+    if not user_ids or not book_rows:
+        return 0
+    rng = random.Random(seed)
+    now = utcnow()
+    next_id = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+    for _, size in _batches(total, batch):
+        orders, items = [], []
+        for order_id in range(next_id, next_id + size):
+            lines = rng.sample(book_rows, k=min(len(book_rows), rng.randint(1, items_per_order * 2 - 1)))
+            total_price = 0.0
+            for book_id, price in lines:
+                qty = rng.randint(1, 3)
+                items.append({'order_id': order_id, 'book_id': book_id, 'quantity': qty, 'price': price})
+                total_price += price * qty
+            orders.append({
+                'id': order_id,
+                'user_id': rng.choice(user_ids),
+                'status': rng.choice(STATUSES),
+                'total': round(total_price, 2),
+                'created_at': now - timedelta(minutes=rng.randint(0, days * 24 * 60)),
+            })
+        next_id += size
+        _insert(db, Order, orders)
+        _insert(db, OrderItem, items)
+    _reset_sequence(db, Order)
+    return total
+
+
+def seed_carts(db, total, items_per_cart=3, batch=2000, seed=11):
+    """Crea carritos (uno por usuario sin carrito) con algunos ítems."""
+    user_ids = [i for (i,) in db.session.query(User.id).outerjoin(Cart).filter(Cart.id.is_(None)).limit(total)]
+    book_ids = [i for (i,) in db.session.query(Book.id)]
+    if not user_ids or not book_ids:
+        return 0
+    rng = random.Random(seed)
+    next_id = (db.session.query(db.func.max(Cart.id)).scalar() or 0) + 1
+    for start in range(0, len(user_ids), batch):
+        chunk = user_ids[start:start + batch]
+        carts = [{'id': next_id + i, 'user_id': u, 'updated_at': utcnow()} for i, u in enumerate(chunk)]
+        items = [{'cart_id': c['id'], 'book_id': b, 'quantity': rng.randint(1, 3)}
+                 for c in carts for b in rng.sample(book_ids, k=min(len(book_ids), items_per_cart))]
+        next_id += len(chunk)
+        _insert(db, Cart, carts)
+        _insert(db, CartItem, items)
+    _reset_sequence(db, Cart)
+    return len(user_ids)
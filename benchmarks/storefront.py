@@ -0,0 +1,336 @@
+"""Prueba de carga del flujo de compra completo, con resultados en JSON.
+
+Carga un conjunto de datos configurable (usuarios, libros, categorías y
+pedidos, ver seed.py) y lanza ``--clients`` clientes concurrentes que repiten
+el flujo::
+
+    login -> búsqueda en catalogo -> add_to_cart -> checkout -> payment -> factura (HTML y PDF)
+
+Cada cliente es un usuario distinto. Los formularios se envían con su
+``csrf_token`` (igual que un navegador), así que la app no cambia de
+configuración. Se puede correr contra:
+
+- el cliente de pruebas de Flask, en este proceso (por defecto);
+- un gunicorn local que se levanta para la prueba (``--gunicorn WORKERS``);
+- un servidor que ya está corriendo (``--url``) sobre la misma ``--database-url``.
+
+El resultado (latencia p50/p95/p99 y throughput por ruta, flujos completos y
+fallidos) se escribe como JSON en ``--output`` o en la salida estándar. Con
+``--compare`` se muestra la diferencia con un resultado anterior, para detectar
+regresiones entre commits.
+
+Uso:
+    python -m benchmarks.storefront --users 200 --books 20000 --orders 50000 --clients 8 --iterations 5
+    python -m benchmarks.storefront --gunicorn 4 --database-url postgresql://... --output after.json --compare before.json
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from benchmarks import seed
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+CART_ADD = re.compile(r'/cart/add/(\d+)')
+INVOICE = re.compile(r'/invoice/(\d+)"')
+
+# Orden en que se reportan las rutas
+ROUTES = ['login_form', 'login', 'catalogo_search', 'add_to_cart', 'checkout',
+          'payment_form', 'payment', 'invoice', 'invoice_pdf', 'logout']
+
+
+class FlowError(Exception):
+    pass
+
+
+class TestClientSession:
+    """Sesión sobre el cliente de pruebas de Flask."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=response.mimetype.startswith('text/'))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    """Sesión HTTP con cookies contra un servidor (sin seguir redirecciones)."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                status, raw, content_type = response.status, response.read(), response.headers.get_content_type()
+        except urllib.error.HTTPError as e:
+            status, raw, content_type = e.code, e.read(), e.headers.get_content_type()
+        return status, raw.decode('utf-8', 'replace') if content_type.startswith('text/') else raw
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.flows_ok = 0
+        self.flows_failed = 0
+        self.failures = defaultdict(int)
+
+    def call(self, session, route, method, path, data=None, expect=(200, 302)):
+        t0 = time.perf_counter()
+        status, body = session.request(method, path, data)
+        elapsed = time.perf_counter() - t0
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if status not in expect:
+                self.errors[route] += 1
+        if status not in expect:
+            raise FlowError(f'{route}: {status}')
+        return body
+
+
+def run_flow(session, recorder, email, password, words, rng):
+    """Un recorrido completo de compra. Lanza ``FlowError`` si un paso falla."""
+    page = recorder.call(session, 'login_form', 'GET', '/login', expect=(200,))
+    match = CSRF_TOKEN.search(page)
+    if not match:
+        raise FlowError('login_form: sin csrf_token')
+    token = match.group(1)
+    recorder.call(session, 'login', 'POST', '/login',
+                  {'email': email, 'password': password, 'csrf_token': token}, expect=(302,))
+
+    query = rng.choice(words)
+    page = recorder.call(session, 'catalogo_search', 'GET', f'/catalogo?q={urllib.parse.quote(query)}', expect=(200,))
+    book_ids = CART_ADD.findall(page)
+    if not book_ids:
+        page = recorder.call(session, 'catalogo_search', 'GET', '/catalogo', expect=(200,))
+        book_ids = CART_ADD.findall(page)
+    if not book_ids:
+        raise FlowError('catalogo_search: sin libros')
+    recorder.call(session, 'add_to_cart', 'POST', f'/cart/add/{rng.choice(book_ids)}',
+                  {'quantity': 1, 'csrf_token': token}, expect=(302,))
+
+    recorder.call(session, 'checkout', 'POST', '/checkout', {'csrf_token': token}, expect=(302,))
+    page = recorder.call(session, 'payment_form', 'GET', '/payment', expect=(200,))
+    match = INVOICE.search(page)
+    if not match:
+        raise FlowError('checkout: no se creó el pedido')
+    order_id = match.group(1)
+    recorder.call(session, 'payment', 'POST', '/payment',
+                  {'payment_method': 'card', 'card_number': '4111111111111111', 'expiry_date': '12/30',
+                   'cvv': '123', 'csrf_token': token}, expect=(302,))
+
+    recorder.call(session, 'invoice', 'GET', f'/invoice/{order_id}', expect=(200,))
+    recorder.call(session, 'invoice_pdf', 'GET', f'/invoice/{order_id}.pdf', expect=(200,))
+    recorder.call(session, 'logout', 'GET', '/logout', expect=(302,))
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano de una lista ordenada."""
+    if not values:
+        return 0.0
+    k = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[min(k, len(values) - 1)]
+
+
+def summarize(recorder, wall):
+    routes = {}
+    names = ROUTES + sorted(set(recorder.latencies) - set(ROUTES))
+    for route in names:
+        values = sorted(recorder.latencies.get(route, ()))
+        if not values:
+            continue
+        routes[route] = {
+            'count': len(values),
+            'errors': recorder.errors[route],
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 2),
+            'throughput_rps': round(len(values) / wall, 2),
+        }
+    return {
+        'routes': routes,
+        'flows': {
+            'completed': recorder.flows_ok,
+            'failed': recorder.flows_failed,
+            'failures': dict(recorder.failures),
+            'throughput_per_s': round(recorder.flows_ok / wall, 3),
+        },
+        'wall_seconds': round(wall, 3),
+    }
+
+
+def compare(result, baseline):
+    """Texto con la variación de p95 y throughput por ruta respecto de ``baseline``."""
+    lines = [f"{'ruta':<16}{'p95 antes':>11}{'p95 ahora':>11}{'Δ p95':>9}{'rps antes':>11}{'rps ahora':>11}"]
+    for route, now in result['routes'].items():
+        before = baseline.get('routes', {}).get(route)
+        if not before:
+            continue
+        delta = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        lines.append(f"{route:<16}{before['p95_ms']:>11.1f}{now['p95_ms']:>11.1f}{delta:>+8.0f}%"
+                     f"{before['throughput_rps']:>11.1f}{now['throughput_rps']:>11.1f}")
+    return '\n'.join(lines)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, env):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+         'app:app'],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn terminó al arrancar')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn no respondió en 60 s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto SQLite temporal)')
+    parser.add_argument('--users', type=int, default=100, help='Usuarios sintéticos (uno por cliente como mínimo)')
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--categories', type=int, default=len(seed.CATEGORIES))
+    parser.add_argument('--orders', type=int, default=10000, help='Pedidos históricos')
+    parser.add_argument('--clients', type=int, default=8, help='Clientes concurrentes')
+    parser.add_argument('--iterations', type=int, default=5, help='Flujos completos por cliente')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla de las búsquedas y libros elegidos')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--gunicorn', type=int, metavar='WORKERS', help='Levantar un gunicorn local con N workers')
+    target.add_argument('--url', help='Servidor ya levantado sobre la misma base de datos')
+    parser.add_argument('--output', help='Archivo JSON de resultados (por defecto, salida estándar)')
+    parser.add_argument('--compare', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    elif args.url:
+        parser.error('--url necesita --database-url (la misma base que usa el servidor)')
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'storefront.sqlite3')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import app
+    from models import db, User, Order
+
+    categories = seed.category_names(args.categories)
+    t0 = time.perf_counter()
+    with app.app_context():
+        # Stock de sobra para que el checkout no falle por falta de unidades
+        seed.seed_books(db, args.books, categories=categories, stock=(10_000, 100_000))
+        seed.seed_users(db, max(args.users, args.clients), prefix='storefront', categories=categories)
+        seed.seed_orders(db, max(args.orders - db.session.query(Order).count(), 0))
+        emails = [e for (e,) in db.session.query(User.email).filter(User.email.like('storefront%@example.com'))
+                  .order_by(User.id).limit(args.clients)]
+        dialect = db.engine.dialect.name
+    print(f'Datos cargados en {time.perf_counter() - t0:.1f} s', file=sys.stderr)
+
+    process = None
+    if args.gunicorn:
+        process, base_url = start_gunicorn(args.gunicorn, dict(os.environ))
+    else:
+        base_url = args.url
+
+    recorder = Recorder()
+
+    def client(n):
+        rng = random.Random(args.seed * 1000 + n)
+        for _ in range(args.iterations):
+            session = HTTPSession(base_url) if base_url else TestClientSession(app)
+            try:
+                run_flow(session, recorder, emails[n], seed.PASSWORD, seed.WORDS, rng)
+                with recorder.lock:
+                    recorder.flows_ok += 1
+            except FlowError as e:
+                with recorder.lock:
+                    recorder.flows_failed += 1
+                    recorder.failures[str(e)] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(len(emails))]
+    t0 = time.perf_counter()
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    wall = time.perf_counter() - t0
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'target': f'gunicorn -w {args.gunicorn}' if args.gunicorn else (args.url or 'test_client'),
+            'database': dialect,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'users': args.users, 'books': args.books, 'categories': args.categories, 'orders': args.orders,
+            'clients': len(emails), 'iterations': args.iterations, 'seed': args.seed,
+        },
+        **summarize(recorder, wall),
+    }
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(result, json.load(f)), file=sys.stderr)
+
+    sys.exit(1 if recorder.flows_failed else 0)
+
+
+if __name__ == '__main__':
+    main()
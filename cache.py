@@ -0,0 +1,131 @@
+"""Caché simple con TTL para datos que cambian poco (p. ej. la lista de categorías).
+
+Backends (``CACHE_BACKEND``):
+
+- ``memory`` (por defecto): diccionario del proceso protegido con un lock.
+- ``filesystem``: un archivo JSON por clave en ``CACHE_DIR``. Lo comparten todos
+  los workers de gunicorn de la misma máquina, así que una invalidación en un
+  worker se ve en los demás.
+
+Los valores deben ser serializables a JSON. ``stats()`` devuelve los aciertos y
+fallos por clave para comprobar que la consulta salió del camino caliente. Las
+claves con prefijo (``identity:42``) se cuentan juntas por prefijo.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class FilesystemBackend:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        if entry['expires'] < time.time():
+            return _MISSING
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        # Escritura atómica: archivo temporal + rename
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'expires': time.time() + ttl, 'value': value}, f)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logger.warning(f"No se pudo escribir la caché {key}: {e}")
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class Cache:
+    """Caché con contadores de aciertos/fallos por clave."""
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.default_ttl = 300
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'filesystem':
+            self.backend = FilesystemBackend(app.config['CACHE_DIR'])
+        elif backend == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError(f"CACHE_BACKEND desconocido: {backend}")
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Devuelve el valor en caché o lo calcula con ``loader()`` y lo guarda."""
+        value = self.backend.get(key)
+        group = key.split(':', 1)[0]
+        if value is not _MISSING:
+            self._hits[group] += 1
+            return value
+        self._misses[group] += 1
+        value = loader()
+        self.backend.set(key, value, ttl or self.default_ttl)
+        return value
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def stats(self):
+        keys = sorted(set(self._hits) | set(self._misses))
+        return {k: {'hits': self._hits[k], 'misses': self._misses[k]} for k in keys}
+
+
+cache = Cache()
@@ -0,0 +1,272 @@
+"""Importación y exportación masiva del catálogo en CSV o JSON Lines.
+
+Importación (``/admin/books/import`` o ``flask --app app import-books``):
+
+- el archivo se lee de a una fila (``csv.DictReader`` o una línea JSON por
+  vez) sobre el stream de la subida, así que la memoria no depende de su tamaño;
+- cada fila se valida con los mismos campos que ``BookForm`` (``BookFields``);
+- las filas válidas se escriben en lotes de ``BOOK_IMPORT_BATCH_SIZE``, cada
+  uno en su transacción con ``executemany``. Una fila con ``id`` de un libro
+  existente lo reemplaza (todos sus campos salvo la portada); sin ``id`` (o con
+  uno que no existe) se inserta;
+- si un lote falla en la base se reintenta fila por fila y las filas que
+  fallan se informan junto con las inválidas, con su número de línea.
+
+Las filas inválidas no detienen la importación: el resto se guarda igual.
+
+Columnas: ``id`` (opcional), ``title``, ``author``, ``category``, ``price``,
+``stock`` y ``description``; las demás se ignoran. La portada no se importa.
+
+La exportación (``/admin/books/export``) genera el archivo por partes a medida
+que lee los libros con ``yield_per``, en el mismo formato (más
+``cover_filename``), así que se puede volver a importar.
+"""
+import csv
+import io
+import json
+import os
+
+from flask import request
+from flask_login import current_user
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+from forms import BookFields
+from models import db, Book
+
+FIELDS = ('title', 'author', 'category', 'price', 'stock', 'description')
+EXPORT_COLUMNS = ('id',) + FIELDS + ('cover_filename',)
+REQUIRED_COLUMNS = ('title', 'author', 'price', 'stock')
+
+# Extensión del archivo -> formato
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Errores por fila que se guardan para mostrar (se cuentan todos)
+MAX_ERRORS = 200
+
+IMPORT_ENDPOINT = 'admin_import_books'
+
+
+class CatalogFormatError(ValueError):
+    """El archivo no se puede leer (formato, codificación o columnas)."""
+
+
+class ImportResult:
+    def __init__(self, max_errors=MAX_ERRORS):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # (línea, mensaje), como máximo max_errors
+        self.max_errors = max_errors
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    def summary(self):
+        return (f'{self.rows:,} filas leídas: {self.inserted:,} libros nuevos, '
+                f'{self.updated:,} actualizados, {self.error_count:,} con errores')
+
+
+def format_for(filename):
+    """Formato según la extensión del archivo, o None."""
+    return FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+
+def read_rows(stream, fmt, required=REQUIRED_COLUMNS):
+    """Genera ``(línea, fila, error)`` leyendo ``stream`` (binario) de a poco.
+
+    En CSV verifica que el encabezado tenga las columnas ``required``. Un
+    archivo que no se puede leer lanza ``CatalogFormatError``.
+    """
+    line = 0
+    try:
+        for line, row, error in _parse_rows(stream, fmt, required):
+            yield line, row, error
+    except UnicodeDecodeError:
+        # Se decodifica por bloques: la línea no sería exacta
+        raise CatalogFormatError('El archivo no está en UTF-8.')
+    except csv.Error as e:
+        raise CatalogFormatError(f'CSV inválido en la línea {line + 1}: {e}')
+
+
+def _parse_rows(stream, fmt, required):
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        missing = [c for c in required if c not in (reader.fieldnames or ())]
+        if missing:
+            raise CatalogFormatError(f"Faltan columnas en el CSV: {', '.join(missing)}.")
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'jsonl':
+        for number, line in enumerate(text_stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, None, f'JSON inválido: {e}'
+                continue
+            if not isinstance(row, dict):
+                yield number, None, 'Se esperaba un objeto JSON.'
+                continue
+            yield number, row, None
+    else:
+        raise CatalogFormatError('Formato no soportado: usa un archivo .csv o .jsonl.')
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def validate_row(form, row):
+    """Valida la fila con ``form`` (un ``BookFields`` reutilizado).
+
+    Devuelve ``(valores, None)`` o ``(None, mensaje de error)``.
+    """
+    form.process(MultiDict({name: _text(row.get(name)) for name in FIELDS}))
+    errors = [] if form.validate() else [f"{name}: {' '.join(messages)}" for name, messages in form.errors.items()]
+    book_id = None
+    raw_id = _text(row.get('id'))
+    if raw_id:
+        try:
+            book_id = int(raw_id)
+            if book_id <= 0:
+                raise ValueError
+        except ValueError:
+            errors.append('id: debe ser un entero positivo.')
+    if errors:
+        return None, '; '.join(errors)
+    values = {name: form[name].data for name in FIELDS}
+    values['category'] = values['category'] or None
+    values['description'] = values['description'] or None
+    values['id'] = book_id
+    return values, None
+
+
+def _write(conn, rows):
+    """Escribe un lote; devuelve ``(insertados, actualizados)``."""
+    books = Book.__table__
+    ids = [r['id'] for r in rows if r['id'] is not None]
+    existing = set(conn.execute(select(books.c.id).where(books.c.id.in_(ids))).scalars()) if ids else set()
+    new, new_with_id, updates = [], [], []
+    for row in rows:
+        values = {name: row[name] for name in FIELDS}
+        if row['id'] is None:
+            new.append(values)
+        elif row['id'] in existing:
+            updates.append({'b_id': row['id'], **values})
+        else:
+            # Un id repetido más abajo en el mismo lote ya es una actualización
+            existing.add(row['id'])
+            new_with_id.append({'id': row['id'], **values})
+    if new:
+        conn.execute(books.insert(), new)
+    if new_with_id:
+        conn.execute(books.insert(), new_with_id)
+    if updates:
+        conn.execute(books.update().where(books.c.id == bindparam('b_id')), updates)
+    return len(new) + len(new_with_id), len(updates)
+
+
+def _flush(batch, result):
+    """Guarda el lote en una transacción; si falla, fila por fila."""
+    rows = [values for _, values in batch]
+    try:
+        with db.engine.begin() as conn:
+            inserted, updated = _write(conn, rows)
+    except SQLAlchemyError:
+        inserted = updated = 0
+        for line, values in batch:
+            try:
+                with db.engine.begin() as conn:
+                    i, u = _write(conn, [values])
+            except SQLAlchemyError as e:
+                result.add_error(line, f"Error de la base: {str(getattr(e, 'orig', e)).splitlines()[0]}")
+                continue
+            inserted += i
+            updated += u
+    result.inserted += inserted
+    result.updated += updated
+
+
+def _reset_sequence():
+    """Ajusta la secuencia de ``books.id`` tras insertar ids explícitos (PostgreSQL)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("SELECT setval(pg_get_serial_sequence('books', 'id'), "
+                          "COALESCE((SELECT MAX(id) FROM books), 1))"))
+
+
+def import_books(stream, fmt, batch_size=1000, max_errors=MAX_ERRORS, progress=None):
+    """Importa los libros de ``stream`` (binario, ``fmt`` 'csv' o 'jsonl').
+
+    Lanza ``CatalogFormatError`` si el archivo no se puede leer; las filas ya
+    guardadas hasta ese punto quedan guardadas.
+    """
+    result = ImportResult(max_errors)
+    form = BookFields()
+    batch = []
+    explicit_ids = False
+    try:
+        for line, row, error in read_rows(stream, fmt):
+            result.rows += 1
+            if error is None:
+                values, error = validate_row(form, row)
+            if error is not None:
+                result.add_error(line, error)
+                continue
+            explicit_ids = explicit_ids or values['id'] is not None
+            batch.append((line, values))
+            if len(batch) >= batch_size:
+                _flush(batch, result)
+                batch = []
+                if progress:
+                    progress(result)
+    finally:
+        if batch:
+            _flush(batch, result)
+        if explicit_ids:
+            _reset_sequence()
+    return result
+
+
+def export_books(fmt, batch_size=1000):
+    """Genera el catálogo en ``fmt`` por partes, una por lote de libros."""
+    books = Book.__table__
+    query = (select(*[books.c[name] for name in EXPORT_COLUMNS])
+             .order_by(books.c.id)
+             .execution_options(yield_per=batch_size))
+    result = db.session.execute(query)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in result.partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for rows in result.partitions():
+            yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def init_catalog_io(app):
+    """Sube el límite de tamaño de la petición para la importación (solo admins).
+
+    Se tiene que llamar antes de ``CSRFProtect(app)``: la verificación del token
+    lee el formulario, y el límite se aplica en ese momento.
+    """
+    @app.before_request
+    def _import_upload_limit():
+        if request.endpoint == IMPORT_ENDPOINT and getattr(current_user, 'is_admin', False):
+            request.max_content_length = app.config['BOOK_IMPORT_MAX_BYTES']
@@ -16,5 +16,67 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "clave-por-defecto")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(os.path.dirname(__file__), 'static', 'covers'))
-
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(os.path.dirname(__file__), 'static', 'uploads'))
+    # Máximo de resultados (ordenados por relevancia) de una búsqueda en el catálogo
+    SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", 100))
+    # Segundos tras los que se recalcula la lista de recomendaciones de un usuario
+    # al visitar el catálogo (también se recalcula al pagar o cancelar un pedido)
+    RECOMMENDATION_TTL = int(os.getenv("RECOMMENDATION_TTL", 6 * 3600))
+    # Filas por página en catálogo, pedidos y listados de admin
+    PAGE_SIZE = int(os.getenv("PAGE_SIZE", 24))
+    # Caché: 'memory' (por proceso) o 'filesystem' (compartida entre workers)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(__file__), 'instance', 'cache'))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 300))
+    CATEGORY_CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", 600))
+    # Máximo de sentencias SQL por petición (0 = sin límite). Ver querycount.py
+    SQL_QUERY_LIMIT = int(os.getenv("SQL_QUERY_LIMIT", 0))
+    # Reservas de stock en carritos (ver reservations.py)
+    RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", 15))
+    CART_MAX_AGE_DAYS = int(os.getenv("CART_MAX_AGE_DAYS", 30))
+    # Segundos entre barridos de "flask sweep-carts --loop" (un proceso aparte; 0 = usar cron)
+    RESERVATION_SWEEP_INTERVAL = int(os.getenv("RESERVATION_SWEEP_INTERVAL", 0))
+    SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", 1000))
+    # Facturas PDF direccionadas por contenido (ver invoices.py)
+    INVOICE_DIR = os.getenv("INVOICE_DIR", os.path.join(os.path.dirname(__file__), 'instance', 'invoices'))
+    INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", os.cpu_count() or 2))
+    # Hilos que generan las variantes de las portadas (ver images.py)
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    # Tamaño máximo de una petición (y de una portada) y píxeles máximos de una imagen (ver uploads.py)
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 5 * 1024 * 1024))
+    MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 25_000_000))
+    # Segundos que se guarda en caché la identidad del usuario de la sesión (ver identity.py)
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+    # Hash de contraseñas (ver passwords.py): método de werkzeug con su costo,
+    # procesos por worker (0 = en el mismo hilo), máximo en curso y espera en segundos
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 0))  # 0 = 2 por proceso
+    PASSWORD_HASH_WAIT = float(os.getenv("PASSWORD_HASH_WAIT", 5))
+    # Métricas de Prometheus en /metrics (ver metrics.py): las pueden leer los
+    # admins o quien mande "Authorization: Bearer <METRICS_TOKEN>". Con
+    # METRICS_ALLOW_LOCALHOST=1 también las peticiones desde 127.0.0.1/::1; no
+    # activarlo detrás de un proxy en la misma máquina (todo llega desde localhost)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    METRICS_ALLOW_LOCALHOST = os.getenv("METRICS_ALLOW_LOCALHOST", "0") == "1"
+    METRICS_DIR = os.getenv("METRICS_DIR", "")  # vacío = solo el proceso actual
+    METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+    # Peticiones más lentas que esto (ms) se registran en el log con su SQL (0 = desactivado)
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 0))
+    # Profiler por muestreo (ver profiling.py): fracción de peticiones perfiladas
+    # (0 = solo con la cabecera X-Profile de un admin) y endpoints, separados por comas
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_ENDPOINTS = [e for e in os.getenv("PROFILE_ENDPOINTS", "").split(',') if e]
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), 'instance', 'profiles'))
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+    # Importación masiva de libros (ver catalog_io.py): tamaño máximo del archivo
+    # subido (solo en /admin/books/import) y filas por transacción
+    BOOK_IMPORT_MAX_BYTES = int(os.getenv("BOOK_IMPORT_MAX_BYTES", 200 * 1024 * 1024))
+    BOOK_IMPORT_BATCH_SIZE = int(os.getenv("BOOK_IMPORT_BATCH_SIZE", 1000))
+    # Cambios masivos de stock y precio (ver inventory.apply_changes): filas por lote
+    BULK_UPDATE_BATCH_SIZE = int(os.getenv("BULK_UPDATE_BATCH_SIZE", 1000))
+    # Panel de administración: segundos en caché de los contadores y stock
+    # desde el que un libro cuenta como "stock bajo"
+    ADMIN_STATS_TTL = int(os.getenv("ADMIN_STATS_TTL", 30))
+    LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", 5))
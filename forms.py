@@ -1,11 +1,12 @@
+import math
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
 from models import User
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import IntegerField, FloatField, TextAreaField
-from wtforms.validators import NumberRange, Optional
-from wtforms import StringField
+from wtforms.validators import NumberRange, Optional, InputRequired
+from wtforms import Form, StringField
 
 class RegisterForm(FlaskForm):
     username = StringField('Nombre', validators=[DataRequired(), Length(3,80)])
@@ -33,12 +34,21 @@ class ChangePasswordForm(FlaskForm):
     new_password2 = PasswordField('Confirmar nueva contraseña', validators=[DataRequired(), EqualTo('new_password')])
     submit = SubmitField('Cambiar contraseña')
 
-class BookForm(FlaskForm):
+class BookFields(Form):
+    """Datos de un libro, sin CSRF: los usa BookForm y la importación masiva (catalog_io.py)."""
     title = StringField('Título', validators=[DataRequired(), Length(max=200)])
     author = StringField('Autor', validators=[DataRequired(), Length(max=200)])
     category = StringField('Categoría', validators=[Optional(), Length(max=100)])
-    price = FloatField('Precio', validators=[DataRequired(), NumberRange(min=0)])
-    stock = IntegerField('Stock', validators=[DataRequired(), NumberRange(min=0)])
+    # InputRequired y no DataRequired: precio o stock 0 son válidos
+    price = FloatField('Precio', validators=[InputRequired(), NumberRange(min=0)])
+    stock = IntegerField('Stock', validators=[InputRequired(), NumberRange(min=0)])
     description = TextAreaField('Descripción', validators=[Optional(), Length(max=2000)])
-    cover = FileField('Portada (opcional)', validators=[Optional(), FileAllowed(['jpg','jpeg','png'], 'Solo imágenes')])
+
+    def validate_price(self, field):
+        # NumberRange(min=0) no rechaza inf (ni nan según la versión de WTForms)
+        if field.data is not None and not math.isfinite(field.data):
+            raise ValidationError('Debe ser un número finito.')
+
+class BookForm(FlaskForm, BookFields):
+    cover = FileField('Portada (opcional)', validators=[Optional(), FileAllowed(['jpg','jpeg','png','webp'], 'Solo imágenes')])
     submit = SubmitField('Guardar')
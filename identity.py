@@ -0,0 +1,72 @@
+"""Identidad del usuario de la sesión en caché.
+
+``load_user`` de Flask-Login se ejecuta en cada petición autenticada. En lugar
+de consultar ``users`` cada vez, guarda en la caché (``cache.py``) una
+instantánea con los datos que usan las vistas y las plantillas (id, username,
+email, rol y categorías favoritas) durante ``USER_CACHE_TTL`` segundos.
+
+``current_user`` es entonces un ``UserIdentity`` de solo lectura. Lo que no está
+en la instantánea (``cart``, ``orders``, ``check_password``...) carga el
+``User`` completo del ORM la primera vez que se pide; las vistas que modifican
+al usuario lo obtienen con ``current_user.load()``.
+
+Después de cambiar datos del usuario hay que llamar a ``invalidate_identity``
+(después del commit). Con el backend ``memory`` la invalidación solo se ve en el
+proceso que la hace: en los demás workers el dato viejo dura como mucho el TTL.
+"""
+from flask import current_app
+from flask_login import UserMixin
+
+from cache import cache
+from models import db, User
+
+FIELDS = ('id', 'username', 'email', 'role', 'fav_category1', 'fav_category2')
+
+
+def _key(user_id):
+    return f'identity:{user_id}'
+
+
+class UserIdentity(UserMixin):
+    """Instantánea inmutable del usuario de la sesión."""
+
+    def __init__(self, data):
+        for field in FIELDS:
+            object.__setattr__(self, field, data[field])
+        object.__setattr__(self, '_user', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"current_user es de solo lectura; usa current_user.load() para modificar '{name}'")
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def load(self):
+        """``User`` completo del ORM (una consulta, solo la primera vez en la petición)."""
+        if self._user is None:
+            object.__setattr__(self, '_user', db.session.get(User, self.id))
+        return self._user
+
+    def __getattr__(self, name):
+        # Solo se llama para atributos que no están en la instantánea
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
+
+def load_identity(user_id):
+    """``UserIdentity`` del usuario (desde la caché), o None si no existe."""
+    def load():
+        user = db.session.get(User, user_id)
+        return {field: getattr(user, field) for field in FIELDS} if user else None
+
+    data = cache.get_or_set(_key(user_id), load, ttl=current_app.config['USER_CACHE_TTL'])
+    return UserIdentity(data) if data else None
+
+
+def invalidate_identity(user_id):
+    cache.delete(_key(user_id))
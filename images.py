@@ -0,0 +1,231 @@
+"""Portadas: almacenamiento por contenido y variantes en AVIF, WebP y JPEG.
+
+Cada portada se guarda con el SHA-256 de su contenido como nombre
+(``<hash>.jpg``), así dos subidas con el mismo nombre ya no se pisan y una
+imagen repetida se guarda una sola vez. Como el contenido de una URL nunca
+cambia, ``/covers/<archivo>`` la sirve con ``Cache-Control: immutable`` y un
+año de vigencia.
+
+Al subir una portada se encola su procesamiento en un pool de hilos
+(``IMAGE_WORKERS``); la petición no espera. Pillow libera el GIL al decodificar,
+redimensionar y codificar, así que los hilos trabajan en paralelo sin los
+problemas de hacer fork dentro de un worker de gunicorn.
+
+Las variantes (miniatura y detalle) se guardan junto al original::
+
+    static/uploads/variants/<hash>.<variante>.<avif|webp|jpg>
+
+El JPEG se escribe al final: si existe, la variante completa está lista. Hasta
+entonces ``Book.image_url()`` sigue sirviendo el original.
+
+Comandos para las portadas ya subidas::
+
+    flask --app app rehash-covers   # renombra por hash y actualiza books.cover_filename
+    flask --app app build-covers    # genera las variantes que falten
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps, features
+
+from uploads import IMAGE_TYPES, PUBLIC_FILE_MODE, detect_format, image_upload_from
+
+logger = logging.getLogger(__name__)
+
+# Caja máxima (ancho, alto) de cada variante; nunca se agranda la imagen.
+# thumb: recomendaciones (160 px de alto) y carrito; detail: tarjetas del catálogo (300 px)
+VARIANTS = {
+    'thumb': (160, 240),
+    'detail': (400, 600),
+}
+
+# (extensión, formato de Pillow, tipo MIME, opciones); el JPEG va al final
+FORMATS = [
+    ('avif', 'AVIF', 'image/avif', {'quality': 50, 'speed': 8}),
+    ('webp', 'WEBP', 'image/webp', {'quality': 75, 'method': 4}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+]
+FORMATS = [f for f in FORMATS if f[1] == 'JPEG' or features.check(f[1].lower())]
+
+VARIANTS_DIR = 'variants'
+
+# Nombres direccionados por contenido: ``<sha256>.<ext>`` y sus variantes
+FINGERPRINTED = re.compile(rf'^(?:{VARIANTS_DIR}/)?[0-9a-f]{{64}}\.[a-z0-9.]+$')
+
+CHUNK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def variant_filename(cover_filename, variant, ext):
+    """Ruta relativa a la carpeta de subidas: ``variants/<nombre>.<variante>.<ext>``."""
+    stem = os.path.splitext(cover_filename)[0]
+    return f'{VARIANTS_DIR}/{stem}.{variant}.{ext}'
+
+
+def variant_ready(cover_filename, variant):
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], variant_filename(cover_filename, variant, 'jpg'))
+    return os.path.exists(path)
+
+
+def cover_url(filename):
+    return url_for('cover_file', filename=filename)
+
+
+def is_fingerprinted(filename):
+    return bool(FINGERPRINTED.match(filename))
+
+
+def cover_sources(cover_filename, variant):
+    """``[(mime, url)]`` de los formatos modernos de la variante, si ya existe."""
+    if not cover_filename or not variant_ready(cover_filename, variant):
+        return []
+    return [
+        (mime, cover_url(variant_filename(cover_filename, variant, ext)))
+        for ext, _, mime, _ in FORMATS if ext != 'jpg'
+    ]
+
+
+def normalized_extension(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return '.jpg' if ext == '.jpeg' else ext
+
+
+def save_cover(f):
+    """Guarda la portada subida (``FileStorage``) con su SHA-256 como nombre.
+
+    El archivo ya llegó validado y hasheado a un temporal (ver uploads.py); aquí
+    solo se mueve a su nombre definitivo. Si ya existe uno con el mismo
+    contenido no se vuelve a escribir. Devuelve ``(nombre, es_nueva)``.
+    """
+    upload = image_upload_from(f)
+    upload.check_complete()
+    filename = upload.sha256.hexdigest() + IMAGE_TYPES[upload.format]
+    is_new = upload.claim(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    return filename, is_new
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rehash_uploads(db, Book):
+    """Renombra las portadas existentes por su hash y actualiza ``books.cover_filename``.
+
+    Primero copia cada archivo a su nombre nuevo, después actualiza la base de
+    datos (un commit) y recién entonces borra los originales: si algo falla a
+    mitad de camino, ninguna portada queda apuntando a un archivo inexistente.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    renames = {}
+    duplicates = 0
+    for name in sorted(os.listdir(upload_folder)):
+        path = os.path.join(upload_folder, name)
+        if not os.path.isfile(path) or is_fingerprinted(name) or name.startswith('.'):
+            continue
+        with open(path, 'rb') as f:
+            fmt = detect_format(f.read(12))
+        new_name = file_digest(path) + IMAGE_TYPES.get(fmt, normalized_extension(name))
+        new_path = os.path.join(upload_folder, new_name)
+        if os.path.exists(new_path):
+            duplicates += 1
+        else:
+            shutil.copy2(path, new_path)
+        renames[name] = new_name
+
+    books = 0
+    for old, new in renames.items():
+        books += db.session.execute(
+            db.update(Book).where(Book.cover_filename == old).values(cover_filename=new)
+        ).rowcount
+    db.session.commit()
+
+    variants_dir = os.path.join(upload_folder, VARIANTS_DIR)
+    old_variants = os.listdir(variants_dir) if os.path.isdir(variants_dir) else []
+    for name in renames:
+        os.unlink(os.path.join(upload_folder, name))
+        prefix = os.path.splitext(name)[0] + '.'
+        for variant in old_variants:
+            if variant.startswith(prefix):
+                os.unlink(os.path.join(variants_dir, variant))
+    return {'files': len(renames), 'duplicates': duplicates, 'books': books}
+
+
+def _save_atomic(image, path, fmt, options):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, fmt, **options)
+        os.chmod(tmp, PUBLIC_FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def process_cover(upload_folder, cover_filename):
+    """Genera todas las variantes de una portada. Devuelve los archivos escritos."""
+    source = os.path.join(upload_folder, cover_filename)
+    os.makedirs(os.path.join(upload_folder, VARIANTS_DIR), exist_ok=True)
+    written = []
+    with Image.open(source) as original:
+        # Decodificar el JPEG directamente a una escala menor es mucho más rápido
+        largest = max(VARIANTS.values())
+        original.draft('RGB', (largest[0] * 2, largest[1] * 2))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, 'white')
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+
+        for variant, size in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            for ext, fmt, _, options in FORMATS:
+                name = variant_filename(cover_filename, variant, ext)
+                _save_atomic(resized, os.path.join(upload_folder, name), fmt, options)
+                written.append(name)
+    return written
+
+
+def _run(upload_folder, cover_filename):
+    try:
+        return process_cover(upload_folder, cover_filename)
+    except Exception:
+        logger.exception(f"Error al generar las variantes de {cover_filename}")
+        return []
+
+
+def init_images(app):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='covers')
+
+
+def enqueue_cover(cover_filename):
+    """Encola la generación de variantes y devuelve el ``Future`` sin esperar."""
+    return _executor.submit(_run, current_app.config['UPLOAD_FOLDER'], cover_filename)
+
+
+def build_all(cover_filenames):
+    """Genera (en el pool) las variantes que falten y espera a que terminen."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    futures = [
+        _executor.submit(_run, upload_folder, name) for name in cover_filenames
+        if os.path.exists(os.path.join(upload_folder, name))
+        and not all(variant_ready(name, variant) for variant in VARIANTS)
+    ]
+    return sum(1 for f in futures if f.result())
@@ -0,0 +1,221 @@
+"""Movimientos de stock seguros ante concurrencia.
+
+El stock nunca se lee y luego se escribe desde Python. Cada libro se descuenta
+con un UPDATE condicional::
+
+    UPDATE books SET stock = stock - :q WHERE id = :id AND stock >= :q
+
+que es atómico: si dos compradores compiten por las últimas unidades, solo uno
+de los UPDATE afecta la fila. Los libros se procesan ordenados por id para que
+dos transacciones nunca se bloqueen en orden inverso (deadlock) en PostgreSQL.
+
+En SQLite la transacción se abre con ``BEGIN IMMEDIATE`` para tomar el lock de
+escritura desde el principio: las compras concurrentes se serializan (esperan
+el ``busy_timeout``) en vez de fallar a mitad de la transacción.
+
+Los cambios masivos de stock y precio (``apply_changes``, ver
+``/admin/books/bulk-update`` y ``flask bulk-update``) usan la misma idea por
+lotes: un solo ``UPDATE ... FROM (VALUES ...)`` por lote, con la condición de
+no dejar stock negativo. Si alguna fila del lote no se puede aplicar, el lote
+completo se deshace.
+"""
+import math
+
+from sqlalchemy import or_, select, text
+
+from models import db, Book
+from reservations import held_by_others, held_by_cart
+
+books = Book.__table__
+
+
+def begin_write():
+    """Abre la transacción de escritura (BEGIN IMMEDIATE en SQLite)."""
+    if db.engine.dialect.name == 'sqlite':
+        conn = db.session.connection()
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def take_stock(quantities, cart_id=None):
+    """Descuenta ``{book_id: cantidad}``. Devuelve el id del primer libro sin stock
+    suficiente (y no descuenta nada más), o None si todo se pudo descontar.
+
+    Con ``cart_id``, las unidades reservadas por otros carritos no se consideran
+    disponibles, salvo que el carrito tenga su propia reserva activa por esa
+    cantidad: quien reservó primero siempre puede comprar mientras haya stock
+    (ver reservations.py).
+
+    Si devuelve un id, el llamador debe hacer rollback.
+    """
+    for book_id in sorted(quantities):
+        qty = quantities[book_id]
+        condition = books.c.stock >= qty
+        if cart_id is not None:
+            condition = condition & or_(
+                books.c.stock - held_by_others(books.c.id, cart_id) >= qty,
+                held_by_cart(books.c.id, cart_id) >= qty,
+            )
+        result = db.session.execute(
+            books.update()
+            .where(books.c.id == book_id, condition)
+            .values(stock=books.c.stock - qty)
+        )
+        if result.rowcount != 1:
+            return book_id
+    return None
+
+
+def return_stock(quantities):
+    """Devuelve ``{book_id: cantidad}`` al stock (cancelaciones)."""
+    for book_id in sorted(quantities):
+        db.session.execute(
+            books.update()
+            .where(books.c.id == book_id)
+            .values(stock=books.c.stock + quantities[book_id])
+        )
+
+
+def quantities_of(items):
+    """Agrupa ítems de carrito o pedido en ``{book_id: cantidad}``."""
+    quantities = {}
+    for item in items:
+        quantities[item.book_id] = quantities.get(item.book_id, 0) + item.quantity
+    return quantities
+
+
+# --- Cambios masivos de stock y precio ---
+# Las columnas de VALUES se llaman column1, column2... en SQLite y PostgreSQL.
+# No se usa un WITH: sqlite3 no informa filas afectadas si la sentencia no
+# empieza con UPDATE.
+BULK_UPDATE_SQL = """
+UPDATE books
+SET stock = books.stock + changes.delta,
+    price = COALESCE(changes.price, books.price)
+FROM (
+    SELECT column1 AS id, column2 AS delta, column3 AS price FROM (VALUES {values}) AS v
+) AS changes
+WHERE books.id = changes.id AND books.stock + changes.delta >= 0
+"""
+
+
+def parse_change(row):
+    """Valida ``{'id', 'stock_delta', 'price'}`` (números o textos).
+
+    Devuelve ``((book_id, delta, price), None)`` o ``(None, mensaje de error)``;
+    ``price`` es None si no cambia.
+    """
+    def value(name):
+        raw = row.get(name)
+        return None if raw is None or str(raw).strip() == '' else str(raw).strip()
+
+    try:
+        book_id = int(value('id'))
+        if book_id <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return None, 'id: debe ser un entero positivo.'
+    delta, price = value('stock_delta'), value('price')
+    if delta is None and price is None:
+        return None, 'Falta stock_delta o price.'
+    try:
+        delta = int(delta or 0)
+    except ValueError:
+        return None, 'stock_delta: debe ser un entero.'
+    if price is not None:
+        try:
+            price = float(price)
+        except ValueError:
+            price = -1
+        if not math.isfinite(price) or price < 0:
+            return None, 'price: debe ser un número mayor o igual a 0.'
+    return (book_id, delta, price), None
+
+
+def _rejected(changes):
+    """Motivo por el que cada cambio no se aplicaría, leyendo el stock actual."""
+    stock = dict(db.session.execute(select(books.c.id, books.c.stock).where(books.c.id.in_(changes))).all())
+    errors = {}
+    for book_id, (delta, _) in changes.items():
+        if book_id not in stock:
+            errors[book_id] = 'El libro no existe.'
+        elif stock[book_id] + delta < 0:
+            errors[book_id] = f'Stock insuficiente (hay {stock[book_id]}, cambio {delta}).'
+    return errors
+
+
+def apply_batch(changes):
+    """Aplica ``{book_id: (delta, precio o None)}`` en una transacción.
+
+    Devuelve ``{}`` si se aplicó todo, o ``{book_id: motivo}`` y no cambia nada.
+    """
+    params = {}
+    values = []
+    for n, (book_id, (delta, price)) in enumerate(sorted(changes.items())):
+        values.append(f'(CAST(:i{n} AS INTEGER), CAST(:d{n} AS INTEGER), CAST(:p{n} AS FLOAT))')
+        params.update({f'i{n}': book_id, f'd{n}': delta, f'p{n}': price})
+    begin_write()
+    result = db.session.execute(text(BULK_UPDATE_SQL.format(values=', '.join(values))), params)
+    if result.rowcount == len(changes):
+        db.session.commit()
+        return {}
+    db.session.rollback()
+    # Releído fuera de la transacción: sirve para explicar el rechazo
+    return _rejected(changes) or {book_id: 'Cambió mientras se aplicaba el lote; reintentar.' for book_id in changes}
+
+
+def apply_changes(rows, batch_size=1000, max_errors=200):
+    """Aplica los cambios de ``rows`` en lotes de ``batch_size`` filas.
+
+    ``rows`` genera ``(número, fila, error)`` como ``catalog_io.read_rows``.
+
+    Cada lote es atómico: una fila inválida, un libro inexistente o un stock
+    que quedaría negativo rechaza el lote completo. Dentro de un lote, varias
+    filas del mismo libro se combinan (suma de deltas, último precio).
+    """
+    summary = {'rows': 0, 'batches': 0, 'applied_batches': 0, 'failed_batches': 0,
+               'updated': 0, 'error_count': 0, 'errors': []}
+
+    def add_error(batch_number, number, book_id, message):
+        summary['error_count'] += 1
+        if len(summary['errors']) < max_errors:
+            summary['errors'].append({'batch': batch_number, 'row': number, 'id': book_id, 'error': message})
+
+    def flush(batch):
+        summary['batches'] += 1
+        batch_number = summary['batches']
+        changes, rows_of, invalid = {}, {}, []
+        for number, row, error in batch:
+            change = None
+            if error is None:
+                change, error = parse_change(row)
+            if error:
+                invalid.append((number, row.get('id') if row else None, error))
+                continue
+            book_id, delta, price = change
+            old_delta, old_price = changes.get(book_id, (0, None))
+            changes[book_id] = (old_delta + delta, price if price is not None else old_price)
+            rows_of.setdefault(book_id, number)
+        if invalid:
+            for number, book_id, error in invalid:
+                add_error(batch_number, number, book_id, error)
+        elif changes:
+            rejected = apply_batch(changes)
+            for book_id, error in rejected.items():
+                add_error(batch_number, rows_of[book_id], book_id, error)
+            if not rejected:
+                summary['applied_batches'] += 1
+                summary['updated'] += len(changes)
+                return
+        summary['failed_batches'] += 1
+
+    batch = []
+    for number, row, error in rows:
+        summary['rows'] += 1
+        batch.append((number, row, error))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return summary
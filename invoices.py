@@ -0,0 +1,278 @@
+"""Facturas en PDF generadas con reportlab.
+
+La factura se genera una sola vez por estado final del pedido:
+
+- al pasar a un estado vendido (``paid``, ``shipped``, ``delivered``) se emite la
+  factura; el envío y la entrega no la cambian porque el PDF no muestra el
+  estado logístico.
+- si un pedido ya facturado se cancela, se genera una vez más marcada como
+  ANULADA.
+
+El PDF se guarda direccionado por contenido en ``INVOICE_DIR``
+(``ab/abcdef....pdf``, donde el nombre es el SHA-256 del archivo) y el pedido
+solo guarda el hash (``orders.invoice_hash``). El hash es también el ETag con
+el que se sirve, así que el navegador revalida con un 304 sin volver a
+descargarlo.
+
+Para generar en bloque (p. ej. cierre de mes) sin cargar a los workers web::
+
+    flask --app app render-invoices --from 2026-09-01 --to 2026-09-30 --workers 4
+
+El renderizado corre en un pool de procesos; cada proceso recibe diccionarios
+simples (``invoice_data``) y no toca la base de datos.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from flask import current_app
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Order, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Estados con factura emitida y estado con factura anulada
+INVOICED_STATUSES = ('paid', 'shipped', 'delivered')
+VOID_STATUS = 'cancelled'
+
+
+def expected_kind(order):
+    """'issued', 'void' o None si el pedido (todavía) no lleva factura."""
+    if order.status in INVOICED_STATUSES:
+        return 'issued'
+    if order.status == VOID_STATUS and order.invoice_hash:
+        return 'void'
+    return None
+
+
+def invoice_data(order, kind):
+    """Datos de la factura como tipos simples (se envían a otros procesos)."""
+    return {
+        'order_id': order.id,
+        'kind': kind,
+        'created_at': order.created_at.strftime('%d/%m/%Y %H:%M') if order.created_at else 'N/A',
+        'customer': {'id': order.user.id, 'username': order.user.username, 'email': order.user.email},
+        'items': [
+            {'title': item.book.title, 'author': item.book.author,
+             'quantity': item.quantity, 'price': item.price}
+            for item in order.items
+        ],
+        'total': order.total or 0.0,
+    }
+
+
+def render_pdf(data):
+    """Dibuja la factura y devuelve los bytes del PDF.
+
+    ``invariant=1`` quita la fecha de creación y el id aleatorio del PDF: los
+    mismos datos producen siempre los mismos bytes (y el mismo hash).
+    """
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    pdf.setTitle(f"Factura #{data['order_id']}")
+    width, height = A4
+    left, right = 20 * mm, width - 20 * mm
+
+    y = height - 25 * mm
+    pdf.setFont('Helvetica-Bold', 18)
+    pdf.drawString(left, y, 'FACTURA DE COMPRA')
+    pdf.setFont('Helvetica', 11)
+    pdf.drawRightString(right, y, f"Pedido #{data['order_id']}")
+    y -= 6 * mm
+    pdf.drawRightString(right, y, f"Fecha: {data['created_at']}")
+
+    y -= 12 * mm
+    customer = data['customer']
+    pdf.setFont('Helvetica-Bold', 11)
+    pdf.drawString(left, y, 'Cliente')
+    pdf.setFont('Helvetica', 10)
+    for line in (customer['username'], customer['email'], f"ID Cliente: {customer['id']}"):
+        y -= 5 * mm
+        pdf.drawString(left, y, line)
+
+    # Tabla de productos
+    columns = (left, right - 70 * mm, right - 35 * mm, right)
+    y -= 12 * mm
+    pdf.setFillColor(colors.HexColor('#0d6efd'))
+    pdf.rect(left, y - 2 * mm, right - left, 7 * mm, stroke=0, fill=1)
+    pdf.setFillColor(colors.white)
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.drawString(columns[0] + 2 * mm, y, 'Producto')
+    pdf.drawRightString(columns[1], y, 'Cantidad')
+    pdf.drawRightString(columns[2], y, 'Precio Unitario')
+    pdf.drawRightString(columns[3] - 2 * mm, y, 'Subtotal')
+    pdf.setFillColor(colors.black)
+
+    for item in data['items']:
+        y -= 11 * mm
+        if y < 40 * mm:
+            pdf.showPage()
+            y = height - 25 * mm
+        pdf.setFont('Helvetica-Bold', 10)
+        pdf.drawString(columns[0] + 2 * mm, y, item['title'][:60])
+        pdf.setFont('Helvetica', 10)
+        pdf.drawRightString(columns[1], y, str(item['quantity']))
+        pdf.drawRightString(columns[2], y, f"${item['price']:.2f}")
+        pdf.drawRightString(columns[3] - 2 * mm, y, f"${item['price'] * item['quantity']:.2f}")
+        pdf.setFont('Helvetica', 8)
+        pdf.setFillColor(colors.grey)
+        pdf.drawString(columns[0] + 2 * mm, y - 4 * mm, f"Autor: {item['author'][:70]}")
+        pdf.setFillColor(colors.black)
+
+    y -= 8 * mm
+    pdf.line(columns[1] - 20 * mm, y, right, y)
+    pdf.setFont('Helvetica', 10)
+    for label, value in (('Subtotal:', data['total']), ('Impuestos:', 0.0)):
+        y -= 6 * mm
+        pdf.drawString(columns[1] - 20 * mm, y, label)
+        pdf.drawRightString(right - 2 * mm, y, f"${value:.2f}")
+    y -= 8 * mm
+    pdf.setFont('Helvetica-Bold', 12)
+    pdf.drawString(columns[1] - 20 * mm, y, 'Total:')
+    pdf.drawRightString(right - 2 * mm, y, f"${data['total']:.2f}")
+
+    if data['kind'] == 'void':
+        pdf.saveState()
+        pdf.setFillColor(colors.red)
+        pdf.setFont('Helvetica-Bold', 60)
+        pdf.translate(width / 2, height / 2)
+        pdf.rotate(30)
+        pdf.drawCentredString(0, 0, 'ANULADA')
+        pdf.restoreState()
+
+    pdf.setFont('Helvetica', 8)
+    pdf.setFillColor(colors.grey)
+    pdf.drawCentredString(width / 2, 15 * mm, 'Gracias por tu compra. Este es tu comprobante oficial.')
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def invoice_path(directory, digest):
+    return os.path.join(directory, digest[:2], f'{digest}.pdf')
+
+
+def store(content, directory):
+    """Guarda el PDF con su SHA-256 como nombre (si no existe) y devuelve el hash."""
+    digest = hashlib.sha256(content).hexdigest()
+    path = invoice_path(directory, digest)
+    if os.path.exists(path):
+        return digest
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Escritura atómica: archivo temporal + rename
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return digest
+
+
+def render_and_store(data, directory):
+    """Tarea del pool de procesos: devuelve ``(order_id, kind, hash)``."""
+    return data['order_id'], data['kind'], store(render_pdf(data), directory)
+
+
+def issue_invoice(order, force=False):
+    """Genera y guarda la factura si el pedido llegó a un estado final que la
+    requiere y todavía no la tiene (o siempre, con ``force``).
+
+    Se llama después del commit de las vistas que cambian el estado del pedido:
+    el PDF se renderiza fuera de esa transacción (en SQLite, sin tener el lock
+    de escritura de ``begin_write``) y el hash se guarda con un UPDATE aparte,
+    solo si el pedido sigue en el mismo estado. Hace commit. Si el proceso se
+    corta antes, ``/invoice/<id>.pdf`` la genera al pedirla.
+    """
+    kind = expected_kind(order)
+    if kind is None or (order.invoice_kind == kind and not force):
+        return None
+    data = invoice_data(order, kind)
+    status = order.status
+    # Cerrar la transacción de lectura antes de renderizar
+    db.session.commit()
+    digest = store(render_pdf(data), current_app.config['INVOICE_DIR'])
+    changed = db.session.execute(
+        update(Order).where(Order.id == data['order_id'], Order.status == status)
+        .values(invoice_hash=digest, invoice_kind=kind, invoice_rendered_at=utcnow())
+    ).rowcount
+    db.session.commit()
+    return digest if changed else None
+
+
+def stored_invoice_path(order):
+    """Ruta del PDF del pedido, o None si no tiene o el archivo se perdió."""
+    if not order.invoice_hash:
+        return None
+    path = invoice_path(current_app.config['INVOICE_DIR'], order.invoice_hash)
+    return path if os.path.exists(path) else None
+
+
+def render_range(date_from=None, date_to=None, workers=None, force=False, batch_size=500):
+    """Genera las facturas de los pedidos creados en ``[date_from, date_to)`` en
+    un pool de procesos. Con ``force`` vuelve a generar las que ya existen.
+
+    Devuelve ``{'rendered': n, 'skipped': m}``.
+    """
+    directory = current_app.config['INVOICE_DIR']
+    workers = workers or current_app.config['INVOICE_WORKERS']
+    query = Order.query.options(joinedload(Order.user), selectinload(Order.items)).filter(
+        Order.status.in_(INVOICED_STATUSES + (VOID_STATUS,))
+    )
+    if date_from:
+        query = query.filter(Order.created_at >= date_from)
+    if date_to:
+        query = query.filter(Order.created_at < date_to)
+
+    rendered = skipped = 0
+    last_id = 0
+    task = partial(render_and_store, directory=directory)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            orders = query.filter(Order.id > last_id).order_by(Order.id).limit(batch_size).all()
+            if not orders:
+                break
+            last_id = orders[-1].id
+            pending = []
+            statuses = {}  # estado de cada pedido al armar el lote
+            for order in orders:
+                kind = expected_kind(order)
+                if kind is None or (not force and order.invoice_kind == kind and stored_invoice_path(order)):
+                    skipped += 1
+                    continue
+                pending.append(invoice_data(order, kind))
+                statuses[order.id] = order.status
+            db.session.expunge_all()
+            # Cerrar la transacción de lectura mientras renderiza el pool
+            db.session.commit()
+
+            now = utcnow()
+            for order_id, kind, digest in pool.map(task, pending, chunksize=16):
+                # Si el pedido cambió de estado mientras tanto (p. ej. se canceló y
+                # issue_invoice ya guardó la anulada) esta factura no se guarda
+                changed = db.session.execute(
+                    update(Order).where(Order.id == order_id, Order.status == statuses[order_id])
+                    .values(invoice_hash=digest, invoice_kind=kind, invoice_rendered_at=now)
+                ).rowcount
+                if changed:
+                    rendered += 1
+                else:
+                    skipped += 1
+            db.session.commit()
+            logger.info(f"Facturas: {rendered} generadas, {skipped} omitidas (hasta el pedido {last_id})")
+    return {'rendered': rendered, 'skipped': skipped}
@@ -0,0 +1,299 @@
+"""Métricas de rendimiento por petición en formato Prometheus (``/metrics``).
+
+Por cada petición se registra, agrupado por endpoint de Flask:
+
+- ``http_request_duration_seconds``: histograma de latencia (método y endpoint);
+- ``http_requests_total``: peticiones por método, endpoint y código de estado;
+- ``http_request_sql_statements`` y ``http_request_sql_seconds``: sentencias SQL
+  y tiempo total en SQL, medidos con los eventos del engine de querycount.py;
+- ``http_response_size_bytes``: tamaño de la respuesta (solo si se conoce, las
+  respuestas en streaming no tienen ``Content-Length``);
+- ``template_render_seconds``: tiempo de cada ``render_template`` por plantilla.
+
+Las peticiones sin ruta (404) se agrupan en el endpoint ``unmatched`` para no
+crear una serie por URL.
+
+Los valores viven en memoria del proceso. Con varios workers de gunicorn
+``/metrics`` mostraría solo los del worker que atiende; con ``METRICS_DIR``
+cada worker vuelca los suyos a ``<METRICS_DIR>/<pid>.json`` cada
+``METRICS_FLUSH_INTERVAL`` segundos y ``/metrics`` suma los de todos. El
+directorio se debe vaciar al reiniciar el servicio.
+
+Con ``SLOW_REQUEST_MS`` configurado, las peticiones más lentas que ese umbral
+dejan un warning en el log con sus sentencias SQL y el tiempo de cada una (sin
+los parámetros, que pueden tener datos personales).
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, request, template_rendered, before_render_template
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+INF_LABEL = 'le="+Inf"'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Caracteres de cada sentencia que se muestran en el log de peticiones lentas
+SLOW_SQL_CHARS = 500
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, values):
+        for labels, value in values.items():
+            self.inc(labels, value)
+
+    def lines(self):
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{_format_labels(self.labels, labels)} {_format_number(value)}'
+
+
+class Histogram:
+    """Histograma acumulativo: ``values[labels] = [conteos por bucket..., suma, total]``."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def merge(self, values):
+        for labels, other in values.items():
+            entry = self.values.get(labels)
+            if entry is None:
+                self.values[labels] = list(other)
+            else:
+                for i, value in enumerate(other):
+                    entry[i] += value
+
+    def lines(self):
+        for labels, entry in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, entry):
+                le = f'le="{_format_number(float(bound))}"'
+                yield f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {count}'
+            yield f'{self.name}_bucket{_format_labels(self.labels, labels, INF_LABEL)} {entry[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_number(entry[-2])}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {entry[-1]}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = [
+            Histogram('http_request_duration_seconds', 'Latencia de las peticiones',
+                      ('method', 'endpoint'), LATENCY_BUCKETS),
+            Counter('http_requests_total', 'Peticiones atendidas', ('method', 'endpoint', 'status')),
+            Histogram('http_request_sql_statements', 'Sentencias SQL por petición',
+                      ('endpoint',), SQL_COUNT_BUCKETS),
+            Histogram('http_request_sql_seconds', 'Tiempo total en SQL por petición',
+                      ('endpoint',), LATENCY_BUCKETS),
+            Histogram('http_response_size_bytes', 'Tamaño del cuerpo de la respuesta',
+                      ('endpoint',), SIZE_BUCKETS),
+            Histogram('template_render_seconds', 'Tiempo de render_template por plantilla',
+                      ('template',), LATENCY_BUCKETS),
+        ]
+        self.by_name = {m.name: m for m in self.metrics}
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self.by_name[name].observe(labels, value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self.by_name[name].inc(labels, amount)
+
+    def snapshot(self):
+        """Valores serializables a JSON (las etiquetas como listas)."""
+        with self._lock:
+            return {
+                m.name: [[list(labels), list(value) if isinstance(value, list) else value]
+                         for labels, value in m.values.items()]
+                for m in self.metrics
+            }
+
+    def render(self, snapshots=()):
+        """Texto de Prometheus con los valores propios más los de ``snapshots``."""
+        total = Registry()
+        for name, values in self.snapshot().items():
+            total.by_name[name].merge({tuple(labels): value for labels, value in values})
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name in total.by_name:
+                    total.by_name[name].merge({tuple(labels): value for labels, value in values})
+        lines = []
+        for metric in total.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.lines())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# --- Volcado a disco para varios workers ---
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'{pid}.json')
+
+
+def flush(directory):
+    """Escribe los valores de este proceso en ``<directory>/<pid>.json`` (atómico)."""
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(tmp, _snapshot_path(directory, os.getpid()))
+    except OSError as e:
+        logger.warning(f"No se pudieron guardar las métricas en {directory}: {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def other_snapshots(directory):
+    """Valores volcados por los demás procesos."""
+    own = f'{os.getpid()}.json'
+    snapshots = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+        if not name.endswith('.json') or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render_metrics(app):
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        flush(directory)
+        return registry.render(other_snapshots(directory))
+    return registry.render()
+
+
+# --- Middleware ---
+def _endpoint():
+    rule = request.url_rule
+    return rule.endpoint if rule is not None else 'unmatched'
+
+
+def _log_slow_request(duration, status):
+    lines = [
+        f"Petición lenta: {request.method} {request.path} ({_endpoint()}) {status} en {duration * 1000:.0f} ms; "
+        f"SQL: {g.get('sql_query_count', 0)} sentencias, {g.get('sql_query_time', 0.0) * 1000:.0f} ms; "
+        f"plantillas: {g.get('template_time', 0.0) * 1000:.0f} ms"
+    ]
+    for statement, elapsed in g.get('sql_log') or ():
+        sql = ' '.join(statement.split())
+        if len(sql) > SLOW_SQL_CHARS:
+            sql = sql[:SLOW_SQL_CHARS] + '...'
+        lines.append(f'  {elapsed * 1000:7.1f} ms  {sql}')
+    logger.warning('\n'.join(lines))
+
+
+def init_metrics(app):
+    """Registra la medición de cada petición. Conviene llamarla antes que las
+    demás extensiones para que su ``before_request`` sea el primero."""
+    last_flush = [time.monotonic()]
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        if app.config.get('SLOW_REQUEST_MS'):
+            g.sql_log = []
+
+    @app.after_request
+    def _record_response(response):
+        g.response_status = response.status_code
+        # Sin Content-Length (streaming) no se mide: calcularlo consumiría el generador
+        size = response.content_length
+        if size is not None:
+            registry.observe('http_response_size_bytes', (_endpoint(),), size)
+        return response
+
+    @app.teardown_request
+    def _record_request(exc):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        endpoint = _endpoint()
+        status = g.get('response_status', 500)
+        registry.observe('http_request_duration_seconds', (request.method, endpoint), duration)
+        registry.inc('http_requests_total', (request.method, endpoint, str(status)))
+        registry.observe('http_request_sql_statements', (endpoint,), g.get('sql_query_count', 0))
+        registry.observe('http_request_sql_seconds', (endpoint,), g.get('sql_query_time', 0.0))
+
+        slow_ms = app.config.get('SLOW_REQUEST_MS')
+        if slow_ms and duration * 1000 >= slow_ms:
+            _log_slow_request(duration, status)
+
+        directory = app.config.get('METRICS_DIR')
+        if directory and time.monotonic() - last_flush[0] >= app.config.get('METRICS_FLUSH_INTERVAL', 10):
+            last_flush[0] = time.monotonic()
+            flush(directory)
+
+    @before_render_template.connect_via(app)
+    def _template_started(sender, template, context, **extra):
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def _template_finished(sender, template, context, **extra):
+        starts = g.get('template_starts')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        g.template_time = g.get('template_time', 0.0) + elapsed
+        registry.observe('template_render_seconds', (template.name or 'string',), elapsed)
@@ -45,6 +45,22 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Objetos del índice de búsqueda (search.py): los crea y mantiene la app y
+# una migración con SQL propio, no los modelos. Sin esto autogenerate
+# propondría borrarlos.
+SEARCH_TABLES = ('books_fts', 'books_fts_data', 'books_fts_idx', 'books_fts_docsize', 'books_fts_config')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and name in SEARCH_TABLES:
+        return False
+    if type_ == 'column' and name == 'search_vector' and object.table.name == 'books':
+        return False
+    if type_ == 'index' and name == 'ix_books_search_vector':
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +81,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +110,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,29 @@
+"""add cart_id to ix_stock_reservations_book_expires
+
+Revision ID: 3c9d5e1a7b42
+Revises: a6e0b3f47c15
+Create Date: 2026-10-18 21:12:37.418906
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9d5e1a7b42'
+down_revision = 'a6e0b3f47c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las sumas de reservas filtran por cart_id: con la columna en el índice
+    # se resuelven sin leer la tabla
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_reservations_book_expires')
+        batch_op.create_index('ix_stock_reservations_book_expires', ['book_id', 'expires_at', 'cart_id', 'quantity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_reservations_book_expires')
+        batch_op.create_index('ix_stock_reservations_book_expires', ['book_id', 'expires_at', 'quantity'], unique=False)
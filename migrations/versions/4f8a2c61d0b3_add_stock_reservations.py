@@ -0,0 +1,51 @@
+"""add stock reservations and carts.updated_at
+
+Revision ID: 4f8a2c61d0b3
+Revises: 9b41c7d2e5a8
+Create Date: 2026-10-18 11:20:37.904112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8a2c61d0b3'
+down_revision = '9b41c7d2e5a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cart_id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.ForeignKeyConstraint(['cart_id'], ['carts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cart_id', 'book_id', name='uq_stock_reservations_cart_book')
+    )
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_reservations_book_expires', ['book_id', 'expires_at', 'quantity'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_reservations_expires_at'), ['expires_at'], unique=False)
+
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_carts_updated_at'), ['updated_at'], unique=False)
+
+    op.execute('UPDATE carts SET updated_at = created_at WHERE updated_at IS NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_carts_updated_at'))
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_expires_at'))
+        batch_op.drop_index('ix_stock_reservations_book_expires')
+
+    op.drop_table('stock_reservations')
@@ -0,0 +1,56 @@
+"""add book search index (FTS5 / tsvector)
+
+Revision ID: 6e2320fbf059
+Revises: 438168e62fc3
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# El DDL del índice es el mismo que crea init_search() al arrancar la app: una
+# sola definición en search.py
+from search import SQLITE_DDL as SQLITE_UPGRADE, POSTGRES_DDL as POSTGRES_UPGRADE
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2320fbf059'
+down_revision = '438168e62fc3'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS books_fts_au",
+    "DROP TRIGGER IF EXISTS books_fts_ad",
+    "DROP TRIGGER IF EXISTS books_fts_ai",
+    "DROP TABLE IF EXISTS books_fts",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_books_search_vector",
+    "DROP TRIGGER IF EXISTS books_search_vector_trg ON books",
+    "DROP FUNCTION IF EXISTS books_search_vector_update()",
+    "ALTER TABLE books DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements):
+    for stmt in statements:
+        op.execute(sa.text(stmt))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_UPGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRES_UPGRADE)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_DOWNGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRES_DOWNGRADE)
@@ -0,0 +1,52 @@
+"""add recommendation tables
+
+Revision ID: 9b41c7d2e5a8
+Revises: 6e2320fbf059
+Create Date: 2026-10-18 10:02:11.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b41c7d2e5a8'
+down_revision = '6e2320fbf059'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('book_popularity',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+    with op.batch_alter_table('book_popularity', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_book_popularity_units_sold'), ['units_sold'], unique=False)
+
+    op.create_table('book_copurchases',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('other_book_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.ForeignKeyConstraint(['other_book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id', 'other_book_id')
+    )
+    op.create_table('user_recommendations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('book_ids', sa.String(length=255), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_recommendations')
+    op.drop_table('book_copurchases')
+    with op.batch_alter_table('book_popularity', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_book_popularity_units_sold'))
+
+    op.drop_table('book_popularity')
@@ -0,0 +1,29 @@
+"""add lower() indexes on users for prefix search
+
+Revision ID: a6e0b3f47c15
+Revises: f2a8d61c9e47
+Create Date: 2026-10-18 17:41:09.664215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e0b3f47c15'
+down_revision = 'f2a8d61c9e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En PostgreSQL text_pattern_ops permite usar el índice con LIKE 'abc%'
+    # sin importar la collation de la base
+    ops = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.create_index('ix_users_lower_username', 'users', [sa.text(f'lower(username){ops}')], unique=False)
+    op.create_index('ix_users_lower_email', 'users', [sa.text(f'lower(email){ops}')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_lower_email', table_name='users')
+    op.drop_index('ix_users_lower_username', table_name='users')
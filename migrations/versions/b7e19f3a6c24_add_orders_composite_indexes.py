@@ -0,0 +1,27 @@
+"""add composite indexes on orders
+
+Revision ID: b7e19f3a6c24
+Revises: 4f8a2c61d0b3
+Create Date: 2026-10-18 12:05:48.772940
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e19f3a6c24'
+down_revision = '4f8a2c61d0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_user_id_id', ['user_id', 'id'], unique=False)
+        batch_op.create_index('ix_orders_status_created_at', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_status_created_at')
+        batch_op.drop_index('ix_orders_user_id_id')
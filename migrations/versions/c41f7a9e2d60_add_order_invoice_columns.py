@@ -0,0 +1,30 @@
+"""add invoice columns to orders
+
+Revision ID: c41f7a9e2d60
+Revises: e3d5a0c9b812
+Create Date: 2026-10-18 14:05:12.318470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f7a9e2d60'
+down_revision = 'e3d5a0c9b812'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('invoice_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('invoice_kind', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('invoice_rendered_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('invoice_rendered_at')
+        batch_op.drop_column('invoice_kind')
+        batch_op.drop_column('invoice_hash')
@@ -0,0 +1,61 @@
+"""add indexes for hot lookup paths
+
+Revision ID: e3d5a0c9b812
+Revises: b7e19f3a6c24
+Create Date: 2026-10-18 12:48:03.116529
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3d5a0c9b812'
+down_revision = 'b7e19f3a6c24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Unificar ítems repetidos del mismo libro en un carrito antes del índice único
+    op.execute("""
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(c2.quantity) FROM cart_items c2
+            WHERE c2.cart_id = cart_items.cart_id AND c2.book_id = cart_items.book_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart_items GROUP BY cart_id, book_id HAVING COUNT(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM cart_items WHERE id NOT IN (
+            SELECT MIN(id) FROM cart_items GROUP BY cart_id, book_id
+        )
+    """)
+
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.create_index('uq_cart_items_cart_book', ['cart_id', 'book_id'], unique=True)
+
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_order_items_book_id'), ['book_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_order_items_order_id'), ['order_id'], unique=False)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_books_category'), ['category'], unique=False)
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_user_id_status_id', ['user_id', 'status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_id_status_id')
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_books_category'))
+
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_order_items_order_id'))
+        batch_op.drop_index(batch_op.f('ix_order_items_book_id'))
+
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.drop_index('uq_cart_items_cart_book')
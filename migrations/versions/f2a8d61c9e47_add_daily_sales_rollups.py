@@ -0,0 +1,56 @@
+"""add daily sales rollup tables
+
+Revision ID: f2a8d61c9e47
+Revises: c41f7a9e2d60
+Create Date: 2026-10-18 16:20:43.102958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8d61c9e47'
+down_revision = 'c41f7a9e2d60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Se crean vacías: llenarlas con "flask --app app rebuild-rollups"
+    op.create_table('daily_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('daily_book_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('day', 'book_id')
+    )
+    with op.batch_alter_table('daily_book_sales', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_daily_book_sales_book_id'), ['book_id'], unique=False)
+
+    op.create_table('daily_category_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'category')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_category_sales')
+    with op.batch_alter_table('daily_book_sales', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_daily_book_sales_book_id'))
+
+    op.drop_table('daily_book_sales')
+    op.drop_table('daily_sales')
@@ -1,11 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password, needs_rehash
 from flask import url_for 
+from datetime import datetime, timezone
+from images import variant_ready, variant_filename, cover_sources, cover_url
 
 db = SQLAlchemy()
 
 
+def utcnow():
+    """Fecha/hora actual en UTC (naive), para columnas calculadas desde Python"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 # MODELO DE USUARIO
 
 
@@ -21,13 +28,26 @@ class User(UserMixin, db.Model):
     fav_category1 = db.Column(db.String(50))
     fav_category2 = db.Column(db.String(50))
 
+    __table_args__ = (
+        # Búsqueda por prefijo sin distinguir mayúsculas en /admin/users (ver
+        # search.prefix_filter); en PostgreSQL con text_pattern_ops para LIKE 'abc%'
+        db.Index('ix_users_lower_username', db.func.lower(username).label('lower_username'),
+                 postgresql_ops={'lower_username': 'text_pattern_ops'}),
+        db.Index('ix_users_lower_email', db.func.lower(email).label('lower_email'),
+                 postgresql_ops={'lower_email': 'text_pattern_ops'}),
+    )
+
     def set_password(self, password):
-        """Guarda la contraseña encriptada"""
-        self.password_hash = generate_password_hash(password)
+        """Guarda la contraseña encriptada (en el pool de passwords.py)"""
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """Verifica si la contraseña es correcta"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True si el hash usa otro algoritmo o costo que PASSWORD_HASH_METHOD"""
+        return needs_rehash(self.password_hash)
 
     @property
     def is_admin(self):
@@ -51,16 +71,26 @@ class Book(db.Model):
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, nullable=False)
     description = db.Column(db.Text)
-    # Categoría del libro (opcional)
-    category = db.Column(db.String(50))
+    # Categoría del libro (opcional); indexada para filtros y DISTINCT
+    category = db.Column(db.String(50), index=True)
     cover_filename = db.Column(db.String(255))  # nombre de archivo de la portada
 
-    def image_url(self):
-        """Devuelve la URL de la imagen o una por defecto"""
+    def image_url(self, variant=None):
+        """Devuelve la URL de la imagen o una por defecto.
+
+        Con ``variant`` ('thumb' o 'detail', ver images.py) devuelve el JPEG
+        redimensionado si ya se generó, y si no el original.
+        """
         if self.cover_filename:
-            return url_for('static', filename=f'uploads/{self.cover_filename}')
+            if variant and variant_ready(self.cover_filename, variant):
+                return cover_url(variant_filename(self.cover_filename, variant, 'jpg'))
+            return cover_url(self.cover_filename)
         return url_for('static', filename='no_cover.png')
 
+    def image_sources(self, variant):
+        """``[(mime, url)]`` AVIF/WebP de la variante, para las etiquetas <source> de <picture>"""
+        return cover_sources(self.cover_filename, variant)
+
     def __repr__(self):
         return f'<Book {self.title}>'
 
@@ -74,6 +104,8 @@ class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Última vez que se agregó o quitó algo; los carritos inactivos se purgan
+    updated_at = db.Column(db.DateTime, default=utcnow, index=True)
     user = db.relationship('User', backref=db.backref('cart', uselist=False))
 
     def __repr__(self):
@@ -91,8 +123,15 @@ class CartItem(db.Model):
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
 
-    cart = db.relationship('Cart', backref=db.backref('items', cascade='all, delete-orphan'))
-    book = db.relationship('Book')
+    # items se cargan en bloque (SELECT ... IN) y cada libro en el mismo JOIN,
+    # así recorrer cart.items -> item.book no genera una consulta por ítem
+    cart = db.relationship('Cart', backref=db.backref('items', cascade='all, delete-orphan', lazy='selectin'))
+    book = db.relationship('Book', lazy='joined')
+
+    __table_args__ = (
+        # Un libro aparece una sola vez por carrito; también sirve la búsqueda de add_to_cart
+        db.Index('uq_cart_items_cart_book', 'cart_id', 'book_id', unique=True),
+    )
 
     def line_total(self):
         """Subtotal del ítem"""
@@ -103,6 +142,30 @@ class CartItem(db.Model):
 
 
 
+# MODELO DE RESERVAS DE STOCK (ver reservations.py)
+
+
+class StockReservation(db.Model):
+    """Unidades de un libro apartadas por un carrito hasta ``expires_at``."""
+    __tablename__ = 'stock_reservations'
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'book_id', name='uq_stock_reservations_cart_book'),
+        # Cubre la suma de reservas activas por libro (también la que excluye o
+        # filtra por carrito, ver reservations.py) sin leer la tabla
+        db.Index('ix_stock_reservations_book_expires', 'book_id', 'expires_at', 'cart_id', 'quantity'),
+    )
+
+    def __repr__(self):
+        return f'<StockReservation cart_id={self.cart_id} book_id={self.book_id} qty={self.quantity}>'
+
+
+
 # MODELOS DE PEDIDO
 
 
@@ -113,9 +176,22 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     status = db.Column(db.String(50), default='created')
     total = db.Column(db.Float, default=0.0)
+    # Factura PDF (ver invoices.py): SHA-256 del archivo, 'issued' o 'void' y fecha
+    invoice_hash = db.Column(db.String(64))
+    invoice_kind = db.Column(db.String(10))
+    invoice_rendered_at = db.Column(db.DateTime)
 
     user = db.relationship('User', backref=db.backref('orders', order_by='Order.id.desc()'))
 
+    __table_args__ = (
+        # Historial de un usuario paginado por id
+        db.Index('ix_orders_user_id_id', 'user_id', 'id'),
+        # Último pedido 'created' del usuario (payment)
+        db.Index('ix_orders_user_id_status_id', 'user_id', 'status', 'id'),
+        # Filtros del panel de pedidos por estado y rango de fechas
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Order id={self.id} user_id={self.user_id} total={self.total}>'
 
@@ -123,13 +199,13 @@ class Order(db.Model):
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     price = db.Column(db.Float, nullable=False)  # precio unitario en el momento del pedido
 
     order = db.relationship('Order', backref=db.backref('items', cascade='all, delete-orphan'))
-    book = db.relationship('Book')
+    book = db.relationship('Book', lazy='joined')
 
     def line_total(self):
         """Subtotal del ítem del pedido"""
@@ -137,3 +213,80 @@ class OrderItem(db.Model):
 
     def __repr__(self):
         return f'<OrderItem book_id={self.book_id} qty={self.quantity} price={self.price}>'
+
+
+
+# MODELOS DE RECOMENDACIONES (precalculadas, ver recommendations.py)
+
+
+class BookPopularity(db.Model):
+    __tablename__ = 'book_popularity'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    units_sold = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    def __repr__(self):
+        return f'<BookPopularity book_id={self.book_id} units={self.units_sold}>'
+
+
+class BookCopurchase(db.Model):
+    """Cuántos pedidos pagados contienen a la vez ``book_id`` y ``other_book_id``."""
+    __tablename__ = 'book_copurchases'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    other_book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    score = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<BookCopurchase {self.book_id}->{self.other_book_id} score={self.score}>'
+
+
+class UserRecommendation(db.Model):
+    __tablename__ = 'user_recommendations'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    book_ids = db.Column(db.String(255), nullable=False, default='')  # ids separados por comas, en orden
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+    user = db.relationship('User', backref=db.backref('recommendation', uselist=False, cascade='all, delete-orphan'))
+
+    def ids(self):
+        """Ids de libros recomendados, en orden"""
+        return [int(i) for i in self.book_ids.split(',') if i]
+
+    def __repr__(self):
+        return f'<UserRecommendation user_id={self.user_id} books={self.book_ids}>'
+
+
+# --- Resúmenes diarios de ventas (ver rollups.py) ---
+# El día es la fecha de creación del pedido; solo cuentan los pedidos vendidos
+class DailySales(db.Model):
+    __tablename__ = 'daily_sales'
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailySales {self.day} orders={self.orders} revenue={self.revenue}>'
+
+
+class DailyBookSales(db.Model):
+    __tablename__ = 'daily_book_sales'
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True, index=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailyBookSales {self.day} book_id={self.book_id} units={self.units}>'
+
+
+class DailyCategorySales(db.Model):
+    __tablename__ = 'daily_category_sales'
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)  # '' = sin categoría
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailyCategorySales {self.day} {self.category!r} units={self.units}>'
@@ -0,0 +1,80 @@
+"""Paginación por cursor (keyset) sobre la columna ``id``.
+
+Las listas se muestran de la más reciente a la más antigua (``id DESC``). En vez
+de OFFSET, la URL lleva el último id visto:
+
+- ``?after=<id>``  → página siguiente (ids menores que ``after``)
+- ``?before=<id>`` → página anterior (ids mayores que ``before``)
+
+Así cada página cuesta lo mismo (un rango sobre la clave primaria) sin importar
+cuántas filas tenga la tabla.
+"""
+from flask import request, url_for
+
+
+def _cursor_arg(name):
+    value = request.args.get(name, type=int)
+    return value if value and value > 0 else None
+
+
+class KeysetPage:
+    """Una página de resultados y los cursores para moverse entre páginas."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def _url(self, **cursor):
+        args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+        args.update(request.view_args or {})
+        args.update(cursor)
+        return url_for(request.endpoint, **args)
+
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.has_next else None
+
+    def prev_url(self):
+        return self._url(before=self.prev_cursor) if self.has_prev else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, column, per_page):
+    """Pagina ``query`` por ``column`` (descendente) leyendo los cursores de la URL."""
+    key = column.key
+    after = _cursor_arg('after')
+    before = _cursor_arg('before')
+
+    if before is not None:
+        # Página anterior: se lee en orden ascendente y luego se invierte
+        rows = query.filter(column > before).order_by(column.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(
+            items,
+            next_cursor=getattr(items[-1], key) if items else None,
+            prev_cursor=getattr(items[0], key) if items and has_prev else None,
+        )
+
+    if after is not None:
+        query = query.filter(column < after)
+    rows = query.order_by(column.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    return KeysetPage(
+        items,
+        next_cursor=getattr(items[-1], key) if items and len(rows) > per_page else None,
+        prev_cursor=getattr(items[0], key) if items and after is not None else None,
+    )
@@ -0,0 +1,136 @@
+"""Hash de contraseñas en un pool de procesos acotado.
+
+scrypt y pbkdf2 son caros a propósito. Hechos dentro de la petición, una ráfaga
+de logins deja a todos los workers con la CPU al 100 %. Aquí se hacen en un
+pool de ``PASSWORD_HASH_WORKERS`` procesos por worker web, con
+``PASSWORD_HASH_MAX_PENDING`` hashes como máximo en curso o en cola. Si no hay
+lugar en ``PASSWORD_HASH_WAIT`` segundos se lanza ``HashingBusy`` (503 con
+``Retry-After``): el servidor rechaza rápido en lugar de acumular peticiones.
+
+Con ``PASSWORD_HASH_WORKERS = 0`` se hashea en el mismo hilo (desarrollo,
+scripts y comandos CLI). Los procesos se crean con ``spawn`` (no heredan
+conexiones ni hilos del worker) y cada uno vuelve a importar el módulo
+``__main__``. Con gunicorn o ``flask run`` ese módulo es el de ellos y los
+procesos del pool solo cargan este módulo y werkzeug. app.py en cambio arma la
+app al importarse (``create_all``, índice de búsqueda, pools) y cada proceso
+del pool repetiría todo eso, por lo que ``python app.py`` hashea siempre en el
+mismo hilo. Los scripts que usen el pool tienen que tener su
+código dentro de ``if __name__ == '__main__':``, como los benchmarks.
+
+El algoritmo y el costo salen de ``PASSWORD_HASH_METHOD`` (formato de werkzeug:
+``scrypt:32768:8:1``, ``pbkdf2:sha256:1000000``...). Si se cambia, los hashes
+guardados se actualizan solos en el siguiente login (``needs_rehash``).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(ServiceUnavailable):
+    pass
+
+
+def normalized_method(method):
+    """Completa los parámetros por defecto: 'scrypt' -> 'scrypt:32768:8:1'."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"PASSWORD_HASH_METHOD desconocido: {method}")
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=0, max_pending=None, wait=5):
+        self.method = normalized_method(method)
+        self.workers = workers
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max_pending or max(workers * 2, 1))
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def _get_pool(self):
+        # El pool se crea en el primer uso y dentro del proceso que lo usa: los
+        # workers de gunicorn nacen por fork y no deben heredar el del padre.
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait):
+            logger.warning("Pool de contraseñas saturado, petición rechazada")
+            raise HashingBusy('Hay demasiados inicios de sesión en curso. Intenta de nuevo en unos segundos.',
+                              retry_after=max(int(self.wait), 1))
+        try:
+            return self._get_pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True si el hash se generó con otro algoritmo o costo que el configurado."""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+
+
+_inline = PasswordHasher()
+
+
+def init_passwords(app):
+    """Crea el hasher de la app según su configuración (se puede volver a llamar)."""
+    old = app.extensions.get('passwords')
+    if old is not None:
+        old.shutdown()
+    app.extensions['passwords'] = PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        wait=app.config['PASSWORD_HASH_WAIT'],
+    )
+
+
+def hasher():
+    """El hasher de la app actual, o uno en línea fuera de un app context."""
+    if has_app_context():
+        return current_app.extensions.get('passwords', _inline)
+    return _inline
+
+
+def hash_password(password):
+    return hasher().hash(password)
+
+
+def verify_password(password_hash, password):
+    return hasher().verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return hasher().needs_rehash(password_hash)
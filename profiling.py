@@ -0,0 +1,201 @@
+"""Profiler por muestreo para peticiones de producción (opcional).
+
+Se activa por petición de dos formas:
+
+- al azar, con probabilidad ``PROFILE_SAMPLE_RATE`` (0 = desactivado),
+  opcionalmente solo para los endpoints de ``PROFILE_ENDPOINTS``;
+- con la cabecera ``X-Profile: 1``, que solo se respeta si la sesión es de un
+  administrador (para perfilar a mano ``catalogo`` o ``checkout``).
+
+Mientras dura la petición, un hilo muestreador lee la pila del hilo que la
+atiende cada ``PROFILE_INTERVAL_MS`` milisegundos (``sys._current_frames``). No
+instrumenta cada llamada como cProfile, así que el costo no depende de cuántas
+funciones se ejecutan y varias peticiones se pueden perfilar a la vez. Una
+petición más corta que el intervalo puede no dejar ninguna muestra (y no se
+guarda).
+
+Cada perfil se guarda en ``PROFILE_DIR`` en formato de pilas colapsadas (una
+línea ``raíz;...;hoja muestras``), que leen directamente ``flamegraph.pl``,
+speedscope o inferno::
+
+    20260101T120000-catalogo-183ms-a1b2c3.folded
+
+La carpeta guarda como máximo ``PROFILE_MAX_FILES`` perfiles: al superarlo se
+borran los más viejos. Se listan y descargan en ``/admin/profiles``.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import g, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+
+# <fecha>-<endpoint>-<duración>ms-<id>.folded
+PROFILE_NAME = re.compile(r'^(\d{8}T\d{6})-([A-Za-z0-9_.]+)-(\d+)ms-[0-9a-f]+\.folded$')
+
+
+class Sampler:
+    """Hilo que toma muestras de las pilas de los hilos registrados."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}  # thread id -> Counter de pilas
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self._lock:
+            self._targets[thread_id] = samples
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return samples
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = dict(self._targets)
+            if not targets:
+                # Sin peticiones perfiladas el hilo queda dormido
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[collapse(frame)] += 1
+            time.sleep(self.interval)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{code.co_qualname}:{frame.f_lineno}'
+
+
+def collapse(frame):
+    """Pila de ``frame`` de la raíz a la hoja, separada por ``;``."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _safe(endpoint):
+    return re.sub(r'[^A-Za-z0-9_.]', '_', endpoint)
+
+
+def write_profile(directory, endpoint, duration, samples):
+    """Guarda las pilas colapsadas y devuelve el nombre del archivo."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    name = f'{stamp}-{_safe(endpoint)}-{int(duration * 1000)}ms-{uuid.uuid4().hex[:6]}.folded'
+    tmp = os.path.join(directory, f'.{name}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    os.replace(tmp, os.path.join(directory, name))
+    return name
+
+
+def prune(directory, max_files):
+    """Borra los perfiles más viejos hasta dejar ``max_files``."""
+    paths = [os.path.join(directory, n) for n in os.listdir(directory) if PROFILE_NAME.match(n)]
+    if len(paths) <= max_files:
+        return
+    paths.sort(key=_mtime)
+    for path in paths[:len(paths) - max_files]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+
+def list_profiles(directory):
+    """Perfiles guardados, del más reciente al más viejo."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        match = PROFILE_NAME.match(name)
+        if not match:
+            continue
+        stamp, endpoint, ms = match.groups()
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        profiles.append({
+            'name': name,
+            'endpoint': endpoint,
+            'created_at': datetime.strptime(stamp, '%Y%m%dT%H%M%S'),
+            'duration_ms': int(ms),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        })
+    profiles.sort(key=lambda p: p['mtime'], reverse=True)
+    return profiles
+
+
+def _should_profile(app):
+    if request.headers.get(HEADER) and getattr(current_user, 'is_admin', False):
+        return True
+    rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+    if not rate or random.random() >= rate:
+        return False
+    endpoints = app.config.get('PROFILE_ENDPOINTS')
+    return not endpoints or request.endpoint in endpoints
+
+
+def init_profiling(app):
+    sampler = Sampler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+
+    @app.before_request
+    def _start_profile():
+        if not _should_profile(app):
+            return
+        g.profile_started = time.perf_counter()
+        sampler.start(threading.get_ident())
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        started = g.pop('profile_started', None)
+        if started is None:
+            return
+        samples = sampler.stop(threading.get_ident())
+        if not samples:
+            return
+        directory = app.config['PROFILE_DIR']
+        try:
+            write_profile(directory, request.endpoint or 'unmatched', time.perf_counter() - started, samples)
+            prune(directory, app.config.get('PROFILE_MAX_FILES', 200))
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el perfil en {directory}: {e}")
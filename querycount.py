@@ -0,0 +1,97 @@
+"""Cuenta las sentencias SQL por petición para detectar consultas N+1.
+
+Con ``SQL_QUERY_LIMIT`` configurado, cada petición que ejecute más sentencias
+que ese límite se reporta: en modo ``TESTING`` lanza ``TooManyQueries`` (la
+prueba falla) y en producción solo deja un warning en el log.
+
+Para pruebas o scripts también se puede medir un bloque concreto::
+
+    with count_queries() as counter:
+        client.get('/cart')
+    assert counter.count <= 4, counter.statements
+
+Además del número, cada petición acumula el tiempo total en SQL
+(``g.sql_query_time``, en segundos). Si la petición define ``g.sql_log`` (una
+lista), cada sentencia se agrega como ``(sql, segundos)``: lo usa el log de
+peticiones lentas de metrics.py.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# Sentencias que se guardan como máximo en ``g.sql_log``
+SQL_LOG_LIMIT = 100
+
+
+class TooManyQueries(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def add(self, statement):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'counters', ()):
+        counter.add(statement)
+    if has_request_context():
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+        if context is not None:
+            context._sql_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_statement(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_sql_started', None)
+    if started is None or not has_request_context():
+        return
+    elapsed = time.perf_counter() - started
+    g.sql_query_time = g.get('sql_query_time', 0.0) + elapsed
+    log = g.get('sql_log')
+    if log is not None and len(log) < SQL_LOG_LIMIT:
+        log.append((statement, elapsed))
+
+
+@contextmanager
+def count_queries():
+    """Cuenta las sentencias ejecutadas dentro del bloque (en este hilo)."""
+    counter = QueryCounter()
+    counters = getattr(_local, 'counters', None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+def init_query_guard(app):
+    """Registra la verificación de ``SQL_QUERY_LIMIT`` al final de cada petición."""
+
+    @app.after_request
+    def _check_query_count(response):
+        limit = app.config.get('SQL_QUERY_LIMIT')
+        count = g.get('sql_query_count', 0)
+        if limit and count > limit:
+            msg = f"{request.method} {request.path} ejecutó {count} sentencias SQL (límite {limit})"
+            if app.testing:
+                raise TooManyQueries(msg)
+            logger.warning(msg)
+        return response
@@ -0,0 +1,210 @@
+"""Recomendaciones de libros precalculadas.
+
+Se mantienen tres tablas (ver models.py):
+
+- ``book_popularity``: unidades vendidas por libro (lista "top" por categoría).
+- ``book_copurchases``: cuántos pedidos contienen a la vez dos libros
+  (co-compra, item a item).
+- ``user_recommendations``: los ids recomendados para cada usuario, ya
+  ordenados. El catálogo solo lee esta fila por clave primaria.
+
+Las dos primeras se actualizan de forma incremental cuando un pedido pasa a un
+estado pagado (o deja de estarlo al cancelarse); la lista de cada usuario se
+recalcula en ese momento y, de forma perezosa, cuando no existe o tiene más de
+``RECOMMENDATION_TTL`` segundos.
+"""
+from datetime import timedelta
+from itertools import permutations
+
+from sqlalchemy import func, select, delete
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Book, Order, OrderItem, BookPopularity, BookCopurchase, UserRecommendation, utcnow
+from inventory import quantities_of
+
+# Estados en los que un pedido cuenta como venta
+SOLD_STATUSES = ('paid', 'shipped', 'delivered')
+
+RECOMMENDATION_COUNT = 8
+
+
+def _upsert_add(model, key_columns, value_column, rows):
+    """INSERT ... ON CONFLICT DO UPDATE SET value = value + excluded.value"""
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(model.__table__)
+        col = model.__table__.c[value_column]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={value_column: col + stmt.excluded[value_column]},
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # Otros motores: fila a fila
+    for row in rows:
+        obj = db.session.get(model, tuple(row[k] for k in key_columns))
+        if obj is None:
+            db.session.add(model(**row))
+        else:
+            setattr(obj, value_column, getattr(obj, value_column) + row[value_column])
+
+
+def record_order(order, sign=1):
+    """Suma (``sign=1``) o resta (``sign=-1``) un pedido de las estadísticas de venta."""
+    quantities = quantities_of(order.items)
+    _upsert_add(BookPopularity, ['book_id'], 'units_sold',
+                [{'book_id': b, 'units_sold': sign * q} for b, q in quantities.items()])
+    _upsert_add(BookCopurchase, ['book_id', 'other_book_id'], 'score',
+                [{'book_id': a, 'other_book_id': b, 'score': sign}
+                 for a, b in permutations(quantities, 2)])
+
+
+def on_order_status_change(order, old_status):
+    """Actualiza las recomendaciones si el pedido entra o sale de un estado vendido.
+
+    No hace commit: se llama antes del commit de la vista que cambia el estado.
+    """
+    was_sold = old_status in SOLD_STATUSES
+    is_sold = order.status in SOLD_STATUSES
+    if was_sold == is_sold:
+        return
+    record_order(order, sign=1 if is_sold else -1)
+    refresh_user(order.user)
+
+
+def compute_for_user(user, limit=RECOMMENDATION_COUNT):
+    """Calcula la lista de ids recomendados para ``user``.
+
+    1. Libros que suelen comprarse junto a lo que ya compró (co-compra).
+    2. Los más vendidos de sus categorías favoritas.
+    3. Los más nuevos de sus categorías favoritas (catálogo sin ventas aún).
+    """
+    purchased = select(OrderItem.book_id).join(Order).where(
+        Order.user_id == user.id, Order.status.in_(SOLD_STATUSES)
+    )
+    exclude = set(db.session.scalars(purchased.distinct()))
+    result = []
+
+    def extend(ids):
+        for book_id in ids:
+            if len(result) >= limit:
+                return
+            if book_id not in exclude and book_id not in result:
+                result.append(book_id)
+
+    if exclude:
+        extend(db.session.scalars(
+            select(BookCopurchase.other_book_id)
+            .where(BookCopurchase.book_id.in_(exclude), BookCopurchase.score > 0)
+            .group_by(BookCopurchase.other_book_id)
+            .order_by(func.sum(BookCopurchase.score).desc(), BookCopurchase.other_book_id.desc())
+            .limit(limit + len(exclude))
+        ))
+
+    favs = [c for c in (user.fav_category1, user.fav_category2) if c]
+    if favs and len(result) < limit:
+        extend(db.session.scalars(
+            select(BookPopularity.book_id).join(Book, Book.id == BookPopularity.book_id)
+            .where(Book.category.in_(favs), BookPopularity.units_sold > 0)
+            .order_by(BookPopularity.units_sold.desc(), Book.id.desc())
+            .limit(limit + len(exclude))
+        ))
+    if favs and len(result) < limit:
+        extend(db.session.scalars(
+            select(Book.id).where(Book.category.in_(favs))
+            .order_by(Book.id.desc()).limit(limit + len(exclude))
+        ))
+    return result
+
+
+def refresh_user(user):
+    """Recalcula y guarda la lista de ``user`` en ``user_recommendations`` (sin commit).
+
+    Se guarda con un upsert: dos peticiones que la calculan a la vez (la
+    primera visita al catálogo en dos pestañas) no chocan por la clave
+    primaria. Devuelve los ids.
+    """
+    ids = compute_for_user(user)
+    values = {'user_id': user.id, 'book_ids': ','.join(str(i) for i in ids), 'updated_at': utcnow()}
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(UserRecommendation.__table__).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'book_ids': stmt.excluded.book_ids, 'updated_at': stmt.excluded.updated_at},
+        )
+        db.session.execute(stmt)
+    else:
+        # Otros motores: el choque se resuelve en recommended_books
+        rec = db.session.get(UserRecommendation, user.id)
+        if rec is None:
+            db.session.add(UserRecommendation(**values))
+        else:
+            rec.book_ids = values['book_ids']
+            rec.updated_at = values['updated_at']
+    return ids
+
+
+def invalidate_user(user_id):
+    """Borra la lista del usuario; se recalcula en su próxima visita al catálogo."""
+    db.session.execute(delete(UserRecommendation).where(UserRecommendation.user_id == user_id))
+
+
+def recommended_books(user, max_age=None):
+    """Libros recomendados para ``user`` leyendo la lista precalculada.
+
+    La lista se recalcula si no existe o si tiene más de ``max_age`` segundos
+    (así aparecen libros nuevos de sus categorías aunque el usuario no compre).
+    """
+    rec = db.session.get(UserRecommendation, user.id)
+    stale = rec is None or (max_age and (rec.updated_at is None
+                                         or rec.updated_at < utcnow() - timedelta(seconds=max_age)))
+    if stale:
+        ids = refresh_user(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición la guardó primero; la lista calculada sirve igual
+            db.session.rollback()
+    else:
+        ids = rec.ids()
+    if not ids:
+        return []
+    books = {b.id: b for b in Book.query.filter(Book.id.in_(ids))}
+    return [books[i] for i in ids if i in books]
+
+
+def rebuild_all():
+    """Recalcula popularidad y co-compras desde cero con agregados SQL."""
+    db.session.execute(delete(UserRecommendation))
+    db.session.execute(delete(BookCopurchase))
+    db.session.execute(delete(BookPopularity))
+
+    sold = select(Order.id).where(Order.status.in_(SOLD_STATUSES))
+    db.session.execute(
+        BookPopularity.__table__.insert().from_select(
+            ['book_id', 'units_sold'],
+            select(OrderItem.book_id, func.sum(OrderItem.quantity))
+            .where(OrderItem.order_id.in_(sold))
+            .group_by(OrderItem.book_id),
+        )
+    )
+
+    a = OrderItem.__table__.alias('a')
+    b = OrderItem.__table__.alias('b')
+    db.session.execute(
+        BookCopurchase.__table__.insert().from_select(
+            ['book_id', 'other_book_id', 'score'],
+            select(a.c.book_id, b.c.book_id, func.count(func.distinct(a.c.order_id)))
+            .join(b, (a.c.order_id == b.c.order_id) & (a.c.book_id != b.c.book_id))
+            .where(a.c.order_id.in_(sold))
+            .group_by(a.c.book_id, b.c.book_id),
+        )
+    )
+    db.session.commit()
@@ -0,0 +1,154 @@
+"""Informes de ventas para el panel de administración (``/admin/reports``).
+
+Ingresos por día, por categoría y por libro y más vendidos se leen de los
+resúmenes diarios que mantiene rollups.py (``daily_sales``,
+``daily_category_sales``, ``daily_book_sales``), agregados con GROUP BY sobre
+los días del rango: unas pocas filas por día en vez de todos los ítems de
+pedidos. Un pedido cuenta como venta en los estados de ``SOLD_STATUSES`` (los
+mismos que las recomendaciones); los ingresos salen de los ítems (precio
+unitario del momento por cantidad). El embudo de estados cuenta ``orders``
+directamente (índice por estado y fecha).
+
+Los rangos son ``[start, end)`` sobre ``Order.created_at`` (medianoche a
+medianoche). Cada informe se puede descargar en CSV: ``stream_csv`` lee el
+resultado con ``yield_per`` (en PostgreSQL un cursor del lado del servidor,
+``stream_results``) y genera el archivo por partes, así que exportar un año de
+pedidos no carga todas las filas en memoria del worker.
+"""
+import csv
+import io
+
+from sqlalchemy import and_, func, select
+
+from models import db, Book, Order, OrderItem, User, DailySales, DailyBookSales, DailyCategorySales
+
+# Orden de los estados en el embudo (cancelled va aparte)
+FUNNEL = ('created', 'paid', 'shipped', 'delivered')
+
+TOP_SELLERS = 20
+
+def _days(model, start, end):
+    return and_(model.day >= start.date(), model.day < end.date())
+
+
+def revenue_by_day(start, end):
+    return (select(DailySales.day, DailySales.orders, DailySales.units, DailySales.revenue)
+            .where(_days(DailySales, start, end), DailySales.orders > 0)
+            .order_by(DailySales.day))
+
+
+def revenue_by_category(start, end):
+    revenue = func.sum(DailyCategorySales.revenue)
+    return (select(DailyCategorySales.category, func.sum(DailyCategorySales.orders).label('orders'),
+                   func.sum(DailyCategorySales.units).label('units'), revenue.label('revenue'))
+            .where(_days(DailyCategorySales, start, end))
+            .group_by(DailyCategorySales.category)
+            .having(func.sum(DailyCategorySales.orders) > 0)
+            .order_by(revenue.desc()))
+
+
+def revenue_by_book(start, end, order_by='revenue', limit=None):
+    units = func.sum(DailyBookSales.units)
+    revenue = func.sum(DailyBookSales.revenue)
+    sort = units if order_by == 'units' else revenue
+    query = (select(Book.id.label('book_id'), Book.title.label('title'), Book.author.label('author'),
+                    Book.category.label('category'), units.label('units'), revenue.label('revenue'))
+             .join_from(DailyBookSales, Book, Book.id == DailyBookSales.book_id)
+             .where(_days(DailyBookSales, start, end))
+             .group_by(Book.id, Book.title, Book.author, Book.category)
+             .having(func.sum(DailyBookSales.orders) > 0)
+             .order_by(sort.desc(), Book.id))
+    return query.limit(limit) if limit else query
+
+
+def top_sellers(start, end, limit=TOP_SELLERS):
+    """Libros con más unidades vendidas."""
+    return revenue_by_book(start, end, order_by='units', limit=limit)
+
+
+def status_counts(start, end):
+    return (select(Order.status.label('status'), func.count().label('orders'), func.sum(Order.total).label('total'))
+            .where(Order.created_at >= start, Order.created_at < end)
+            .group_by(Order.status))
+
+
+def status_funnel(start, end):
+    """Pedidos por estado y cuántos llegaron al menos a cada etapa de ``FUNNEL``.
+
+    ``reached`` de una etapa suma los pedidos en esa etapa o en una posterior;
+    ``rate`` es la fracción de los pedidos no cancelados del rango.
+    """
+    counts = {row.status: row for row in db.session.execute(status_counts(start, end))}
+    active = sum(counts[s].orders for s in FUNNEL if s in counts)
+    funnel = []
+    for i, stage in enumerate(FUNNEL):
+        reached = sum(counts[s].orders for s in FUNNEL[i:] if s in counts)
+        row = counts.get(stage)
+        funnel.append({'status': stage, 'orders': row.orders if row else 0, 'total': row.total if row else 0,
+                       'reached': reached, 'rate': reached / active if active else 0})
+    for status, row in sorted(counts.items()):
+        if status not in FUNNEL:
+            funnel.append({'status': status, 'orders': row.orders, 'total': row.total, 'reached': None, 'rate': None})
+    return funnel
+
+
+def _count(model, *where):
+    return db.session.scalar(select(func.count()).select_from(model).where(*where))
+
+
+def overview(today, low_stock):
+    """Contadores del panel de administración (valores serializables a JSON para la caché).
+
+    Cada uno es una consulta agregada: conteos, pedidos por estado (índice por
+    estado) y los ingresos del día desde ``daily_sales``.
+    """
+    sales = db.session.get(DailySales, today)
+    return {
+        'users': _count(User),
+        'books': _count(Book),
+        'low_stock': _count(Book, Book.stock <= low_stock),
+        'orders_by_status': dict(db.session.execute(select(Order.status, func.count()).group_by(Order.status)).all()),
+        'today_orders': sales.orders if sales else 0,
+        'today_revenue': round(sales.revenue, 2) if sales else 0.0,
+    }
+
+
+def order_lines(start, end):
+    """Una fila por ítem de los pedidos del rango (todos los estados)."""
+    return (select(Order.id.label('order_id'), Order.created_at, Order.status, User.email,
+                   OrderItem.book_id, Book.title, OrderItem.quantity, OrderItem.price,
+                   (OrderItem.price * OrderItem.quantity).label('line_total'))
+            .join_from(Order, User, User.id == Order.user_id)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .join(Book, Book.id == OrderItem.book_id)
+            .where(Order.created_at >= start, Order.created_at < end)
+            .order_by(Order.id, OrderItem.id))
+
+
+# Informes que se pueden descargar: nombre -> consulta(start, end)
+CSV_REPORTS = {
+    'day': revenue_by_day,
+    'category': revenue_by_category,
+    'book': revenue_by_book,
+    'status': status_counts,
+    'orders': order_lines,
+}
+
+
+def _cell(value):
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def stream_csv(query, batch_size=1000):
+    """Genera el CSV de ``query`` (con encabezado) por partes de ``batch_size`` filas."""
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(result.keys())
+    for rows in result.partitions():
+        writer.writerows([_cell(v) for v in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
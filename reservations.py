@@ -0,0 +1,159 @@
+"""Reservas temporales de stock para los carritos.
+
+Al agregar un libro al carrito se aparta la cantidad durante
+``RESERVATION_TTL_MINUTES``. El stock disponible para otros compradores es::
+
+    books.stock - SUM(reservas activas de otros carritos)
+
+y se calcula con el índice ``ix_stock_reservations_book_expires``
+(book_id, expires_at, cart_id, quantity), sin leer la tabla.
+
+Las reservas vencidas dejan de contar en cuanto pasa ``expires_at``; el barrido
+(``sweep``) solo las borra y purga los carritos inactivos, en lotes. Se corre
+desde cron con ``flask --app app sweep-carts`` o como un único proceso aparte
+con ``flask --app app sweep-carts --loop`` (cada ``RESERVATION_SWEEP_INTERVAL``
+segundos); nunca dentro de los workers web, que lo repetirían una vez por
+proceso.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, delete, or_
+
+from models import db, Book, Cart, CartItem, StockReservation, utcnow
+
+logger = logging.getLogger(__name__)
+
+reservations = StockReservation.__table__
+books = Book.__table__
+
+
+def held_by_others(book_id_column, cart_id, now=None):
+    """Subconsulta: unidades reservadas (activas) del libro por otros carritos."""
+    now = now or utcnow()
+    query = select(func.coalesce(func.sum(reservations.c.quantity), 0)).where(
+        reservations.c.book_id == book_id_column,
+        reservations.c.expires_at > now,
+    )
+    if cart_id is not None:
+        query = query.where(reservations.c.cart_id != cart_id)
+    return query.scalar_subquery()
+
+
+def held_by_cart(book_id_column, cart_id, now=None):
+    """Subconsulta: unidades del libro reservadas (activas) por el carrito."""
+    now = now or utcnow()
+    return select(func.coalesce(func.sum(reservations.c.quantity), 0)).where(
+        reservations.c.book_id == book_id_column,
+        reservations.c.cart_id == cart_id,
+        reservations.c.expires_at > now,
+    ).scalar_subquery()
+
+
+def available_stock(book_id, cart_id=None, lock=False):
+    """Stock del libro menos lo reservado por otros carritos.
+
+    Con ``lock=True`` bloquea la fila del libro (SELECT ... FOR UPDATE) hasta el
+    commit, para que dos carritos no reserven a la vez las mismas unidades. En
+    SQLite el bloqueo lo da ``inventory.begin_write()``.
+    """
+    query = select(books.c.stock - held_by_others(books.c.id, cart_id)).where(books.c.id == book_id)
+    if lock:
+        query = query.with_for_update(of=books)
+    return db.session.execute(query).scalar()
+
+
+def reserved_quantities(book_ids):
+    """``{book_id: unidades reservadas}`` para varios libros en una sola consulta."""
+    if not book_ids:
+        return {}
+    rows = db.session.execute(
+        select(reservations.c.book_id, func.sum(reservations.c.quantity))
+        .where(reservations.c.book_id.in_(book_ids), reservations.c.expires_at > utcnow())
+        .group_by(reservations.c.book_id)
+    )
+    return dict(rows.all())
+
+
+def reserve(cart, book_id, quantity):
+    """Fija la reserva del carrito para el libro en ``quantity`` y renueva el plazo."""
+    ttl = timedelta(minutes=current_app.config['RESERVATION_TTL_MINUTES'])
+    now = utcnow()
+    if quantity <= 0:
+        release(cart.id, book_id)
+    else:
+        res = StockReservation.query.filter_by(cart_id=cart.id, book_id=book_id).first()
+        if res is None:
+            res = StockReservation(cart_id=cart.id, book_id=book_id, quantity=quantity, expires_at=now + ttl)
+            db.session.add(res)
+        else:
+            res.quantity = quantity
+            res.expires_at = now + ttl
+    cart.updated_at = now
+
+
+def release(cart_id, book_id=None):
+    """Libera las reservas del carrito (de un libro o todas)."""
+    stmt = delete(StockReservation).where(StockReservation.cart_id == cart_id)
+    if book_id is not None:
+        stmt = stmt.where(StockReservation.book_id == book_id)
+    db.session.execute(stmt)
+
+
+def _delete_in_batches(table, id_query, batch_size):
+    """Borra filas de ``table`` cuyos ids devuelve ``id_query``, en lotes con commit."""
+    total = 0
+    while True:
+        ids = db.session.scalars(id_query.limit(batch_size)).all()
+        if not ids:
+            return total
+        db.session.execute(delete(table).where(table.c.id.in_(ids)))
+        db.session.commit()
+        total += len(ids)
+
+
+def sweep(batch_size=None):
+    """Borra reservas vencidas y purga carritos inactivos. Devuelve los conteos."""
+    config = current_app.config
+    batch_size = batch_size or config['SWEEP_BATCH_SIZE']
+    now = utcnow()
+
+    expired = _delete_in_batches(
+        reservations,
+        select(reservations.c.id).where(reservations.c.expires_at <= now),
+        batch_size,
+    )
+
+    cutoff = now - timedelta(days=config['CART_MAX_AGE_DAYS'])
+    stale = select(Cart.id).where(or_(
+        Cart.updated_at < cutoff,
+        Cart.updated_at.is_(None) & (Cart.created_at < cutoff),
+    ))
+    carts = 0
+    while True:
+        ids = db.session.scalars(stale.limit(batch_size)).all()
+        if not ids:
+            break
+        db.session.execute(delete(StockReservation).where(StockReservation.cart_id.in_(ids)))
+        db.session.execute(delete(CartItem).where(CartItem.cart_id.in_(ids)))
+        db.session.execute(delete(Cart).where(Cart.id.in_(ids)))
+        db.session.commit()
+        carts += len(ids)
+
+    return {'expired_reservations': expired, 'stale_carts': carts}
+
+
+def run_sweeper(app, interval):
+    """Barre cada ``interval`` segundos hasta que se corta el proceso."""
+    while True:
+        with app.app_context():
+            try:
+                result = sweep()
+                if any(result.values()):
+                    logger.info(f"Barrido de carritos: {result}")
+            except Exception:
+                db.session.rollback()
+                logger.exception("Error en el barrido de reservas")
+        time.sleep(interval)
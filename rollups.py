@@ -0,0 +1,164 @@
+"""Resúmenes diarios de ventas mantenidos de forma incremental.
+
+Tres tablas (ver models.py) con pedidos, unidades e ingresos por día:
+
+- ``daily_sales``: total del día;
+- ``daily_book_sales``: por día y libro;
+- ``daily_category_sales``: por día y categoría del libro ('' = sin categoría).
+
+El día es la fecha de creación del pedido y solo cuentan los pedidos en
+``SOLD_STATUSES``, igual que los informes (reports.py), que leen estas tablas:
+un rango de un mes son unas pocas filas por día en lugar de todos los ítems de
+pedidos del mes.
+
+Cuando un pedido entra en un estado vendido o sale de él (pago, cancelación,
+cambio de estado desde el panel) ``on_order_status_change`` suma o resta sus
+ítems con ``INSERT ... ON CONFLICT DO UPDATE``, dentro de la misma transacción
+que cambia el estado. Un pedido recién creado en el checkout todavía no es una
+venta y no cambia nada. Al restar se borran las filas que quedan sin pedidos,
+y ``daily_category_sales`` del día se recalcula
+desde los pedidos en lugar de restar: la categoría del libro pudo cambiar desde
+la venta y restar con la actual descuadraría las dos categorías.
+
+``rebuild`` recalcula las tablas desde ``orders``/``order_items`` (completo o
+para un rango de días): hace falta después de migrar, de cargas masivas que no
+pasan por las vistas (``flask generate-data``) o si la categoría de un libro
+cambió y se quiere reflejar en el historial.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import sqlite, postgresql
+
+from models import db, Book, Order, OrderItem, DailySales, DailyBookSales, DailyCategorySales
+from recommendations import SOLD_STATUSES
+from inventory import begin_write
+
+
+def _upsert_add(model, key_columns, rows):
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col (columnas no clave)"""
+    if not rows:
+        return
+    table = model.__table__
+    value_columns = [c for c in rows[0] if c not in key_columns]
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_ = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert_(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in value_columns},
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # Otros motores: fila a fila
+    for row in rows:
+        obj = db.session.get(model, tuple(row[k] for k in key_columns))
+        if obj is None:
+            db.session.add(model(**row))
+        else:
+            for c in value_columns:
+                setattr(obj, c, getattr(obj, c) + row[c])
+
+
+def record_order(order, sign=1):
+    """Suma (``sign=1``) o resta (``sign=-1``) un pedido de los resúmenes."""
+    day = order.created_at.date()
+    books, categories = {}, {}
+    for item in order.items:
+        units = item.quantity or 0
+        revenue = (item.price or 0) * units
+        for totals, key in ((books, item.book_id), (categories, item.book.category or '')):
+            entry = totals.setdefault(key, [0, 0.0])
+            entry[0] += units
+            entry[1] += revenue
+    if not books:
+        return
+    _upsert_add(DailySales, ['day'], [{
+        'day': day, 'orders': sign,
+        'units': sign * sum(u for u, _ in books.values()),
+        'revenue': sign * sum(r for _, r in books.values()),
+    }])
+    _upsert_add(DailyBookSales, ['day', 'book_id'], [
+        {'day': day, 'book_id': book_id, 'orders': sign, 'units': sign * units, 'revenue': sign * revenue}
+        for book_id, (units, revenue) in books.items()
+    ])
+    if sign < 0:
+        # Filas que quedaron sin pedidos: se borran en vez de dejarlas en cero
+        db.session.execute(delete(DailySales).where(DailySales.day == day, DailySales.orders <= 0))
+        db.session.execute(delete(DailyBookSales).where(
+            DailyBookSales.day == day, DailyBookSales.book_id.in_(list(books)), DailyBookSales.orders <= 0))
+        # La categoría del libro pudo cambiar desde la venta: restar con la
+        # actual dejaría una categoría en negativo y otra de más. Se recalcula
+        # el día desde los pedidos (el estado nuevo ya se ve tras el autoflush).
+        _rebuild_table(DailyCategorySales, day, day + timedelta(days=1))
+        return
+    _upsert_add(DailyCategorySales, ['day', 'category'], [
+        {'day': day, 'category': category, 'orders': sign, 'units': sign * units, 'revenue': sign * revenue}
+        for category, (units, revenue) in categories.items()
+    ])
+
+
+def on_order_status_change(order, old_status):
+    """Actualiza los resúmenes si el pedido entra o sale de un estado vendido.
+
+    No hace commit: se llama antes del commit de la vista que cambia el estado.
+    """
+    was_sold = old_status in SOLD_STATUSES
+    is_sold = order.status in SOLD_STATUSES
+    if was_sold != is_sold:
+        record_order(order, sign=1 if is_sold else -1)
+
+
+def _sources(start, end):
+    """``INSERT ... SELECT`` de cada tabla para los días ``[start, end)``."""
+    day = func.date(Order.created_at)
+    sold = [Order.status.in_(SOLD_STATUSES)]
+    if start:
+        sold.append(Order.created_at >= datetime.combine(start, time.min))
+    if end:
+        sold.append(Order.created_at < datetime.combine(end, time.min))
+    units = func.sum(OrderItem.quantity)
+    revenue = func.sum(OrderItem.price * OrderItem.quantity)
+    orders = func.count(func.distinct(Order.id))
+    category = func.coalesce(Book.category, '')
+
+    items = select().join_from(Order, OrderItem, OrderItem.order_id == Order.id).where(*sold)
+    return {
+        DailySales: items.add_columns(day, orders, units, revenue).group_by(day),
+        DailyBookSales: items.add_columns(day, OrderItem.book_id, orders, units, revenue)
+                             .group_by(day, OrderItem.book_id),
+        DailyCategorySales: items.join(Book, Book.id == OrderItem.book_id)
+                                 .add_columns(day, category, orders, units, revenue)
+                                 .group_by(day, category),
+    }
+
+
+def _rebuild_table(model, start, end, query=None):
+    """Borra las filas de ``model`` de los días ``[start, end)`` y las recalcula (sin commit)."""
+    table = model.__table__
+    condition = []
+    if start:
+        condition.append(table.c.day >= start)
+    if end:
+        condition.append(table.c.day < end)
+    db.session.execute(delete(table).where(*condition))
+    if query is None:
+        query = _sources(start, end)[model]
+    columns = [c.name for c in table.columns]
+    return db.session.execute(insert(table).from_select(columns, query)).rowcount
+
+
+def rebuild(start=None, end=None):
+    """Recalcula los resúmenes de los días ``[start, end)`` (fechas; None = sin límite).
+
+    Borra las filas del rango y las vuelve a insertar con ``INSERT ... SELECT``
+    agrupado en la base. Hace commit; devuelve las filas insertadas por tabla.
+    """
+    counts = {}
+    begin_write()
+    for model, query in _sources(start, end).items():
+        counts[model.__tablename__] = _rebuild_table(model, start, end, query)
+    db.session.commit()
+    return counts
@@ -0,0 +1,189 @@
+"""Búsqueda indexada de libros.
+
+En SQLite se usa una tabla virtual FTS5 (``books_fts``) con contenido externo
+sobre ``books``; en PostgreSQL una columna ``tsvector`` con índice GIN. En ambos
+casos la sincronización la hacen triggers de la base de datos, así que cualquier
+INSERT/UPDATE/DELETE sobre ``books`` (formularios, cargas masivas, etc.) mantiene
+el índice al día. Si ninguno de los dos está disponible se usa ILIKE.
+"""
+import re
+import logging
+
+from sqlalchemy import and_, inspect, text, func, literal_column, or_, select, true
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Book
+
+logger = logging.getLogger(__name__)
+
+# Palabras de la búsqueda (letras/números unicode). Excluye comillas y
+# operadores, así que las expresiones MATCH / tsquery generadas son seguras.
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# 'sqlite', 'postgresql' o None (ILIKE)
+_backend = None
+
+# SQLITE_DDL y POSTGRES_DDL también los usa la migración 6e2320fbf059 (una sola
+# definición). Si cambian, las bases ya migradas no se actualizan solas: hace
+# falta una migración nueva que recree el índice.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, description, category,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, description, category)
+        VALUES (new.id, new.title, new.author, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description, category)
+        VALUES ('delete', old.id, old.title, old.author, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au
+    AFTER UPDATE OF title, author, description, category ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description, category)
+        VALUES ('delete', old.id, old.title, old.author, old.description, old.category);
+        INSERT INTO books_fts(rowid, title, author, description, category)
+        VALUES (new.id, new.title, new.author, new.description, new.category);
+    END
+    """,
+    "INSERT INTO books_fts(books_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', unaccent(coalesce(NEW.title, ''))), 'A') ||
+            setweight(to_tsvector('simple', unaccent(coalesce(NEW.author, ''))), 'A') ||
+            setweight(to_tsvector('simple', unaccent(coalesce(NEW.category, ''))), 'B') ||
+            setweight(to_tsvector('simple', unaccent(coalesce(NEW.description, ''))), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS books_search_vector_trg ON books",
+    """
+    CREATE TRIGGER books_search_vector_trg
+    BEFORE INSERT OR UPDATE OF title, author, description, category ON books
+    FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_books_search_vector ON books USING GIN (search_vector)",
+    # Rellenar las filas existentes (el trigger calcula el vector)
+    "UPDATE books SET title = title WHERE search_vector IS NULL",
+]
+
+
+def _is_installed(dialect):
+    insp = inspect(db.engine)
+    if dialect == 'sqlite':
+        return insp.has_table('books_fts')
+    return any(c['name'] == 'search_vector' for c in insp.get_columns('books'))
+
+
+def init_search():
+    """Crea el índice de búsqueda si falta y elige el backend. Requiere app context."""
+    global _backend
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        _backend = None
+        return _backend
+
+    try:
+        if not _is_installed(dialect):
+            ddl = SQLITE_DDL if dialect == 'sqlite' else POSTGRES_DDL
+            with db.engine.begin() as conn:
+                for stmt in ddl:
+                    conn.execute(text(stmt))
+            logger.info("Índice de búsqueda creado (%s).", dialect)
+        _backend = dialect
+    except SQLAlchemyError as e:
+        logger.warning(f"Búsqueda indexada no disponible, se usará ILIKE: {e}")
+        _backend = None
+    return _backend
+
+
+def search_terms(query):
+    """Separa la búsqueda en palabras normalizadas a minúsculas."""
+    return [t.lower() for t in _TOKEN_RE.findall(query or '')]
+
+
+def ilike_search(books_q, query):
+    """Búsqueda sin índice (ILIKE). Se usa como respaldo y en los benchmarks."""
+    pattern = f'%{query}%'
+    return books_q.filter(or_(
+        Book.title.ilike(pattern),
+        Book.author.ilike(pattern),
+        Book.description.ilike(pattern),
+        Book.category.ilike(pattern),
+    )).order_by(Book.id.desc())
+
+
+def prefix_filter(column, prefix):
+    """Condición "``lower(column)`` empieza con ``prefix``" que puede usar un índice sobre ``lower(column)``.
+
+    En PostgreSQL el índice es ``text_pattern_ops`` y el planificador usa el
+    LIKE directamente; SQLite no usa índices con LIKE (no distingue
+    mayúsculas), así que se agrega el rango ``[prefix, siguiente)``, que con
+    la collation binaria equivale a empezar con ``prefix``. El ``lower()`` de
+    SQLite solo convierte ASCII, así que ahí el prefijo se convierte igual
+    ("Án" encuentra "Ángel", "án" no). Sin prefijo no filtra nada.
+    """
+    if not prefix:
+        return true()
+    expr = func.lower(column)
+    if db.engine.dialect.name == 'sqlite':
+        prefix = ''.join(ch.lower() if ch.isascii() else ch for ch in prefix)
+    else:
+        prefix = prefix.lower()
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    condition = expr.like(escaped + '%', escape='\\')
+    if db.engine.dialect.name == 'sqlite':
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        condition = and_(expr >= prefix, expr < upper, condition)
+    return condition
+
+
+def search_books(books_q, query, limit=None):
+    """Filtra ``books_q`` por ``query`` y lo ordena por relevancia.
+
+    Cada palabra se busca como prefijo y todas deben aparecer (AND) en título,
+    autor, descripción o categoría, sin distinguir tildes ni mayúsculas.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return books_q.order_by(Book.id.desc())
+
+    if _backend == 'sqlite':
+        match = ' '.join(f'"{t}"*' for t in terms)
+        # Pesos bm25 por columna: title, author, description, category
+        hits = select(
+            literal_column('rowid').label('book_id'),
+            func.bm25(literal_column('books_fts'), 10.0, 8.0, 1.0, 4.0).label('score'),
+        ).select_from(text('books_fts')).where(
+            text('books_fts MATCH :match').bindparams(match=match)
+        ).subquery()
+        books_q = books_q.join(hits, hits.c.book_id == Book.id) \
+                         .order_by(hits.c.score, Book.id.desc())
+    elif _backend == 'postgresql':
+        tsquery = func.to_tsquery('simple', func.unaccent(' & '.join(f'{t}:*' for t in terms)))
+        vector = literal_column('books.search_vector')
+        books_q = books_q.filter(vector.op('@@')(tsquery)) \
+                         .order_by(func.ts_rank(vector, tsquery).desc(), Book.id.desc())
+    else:
+        books_q = ilike_search(books_q, query)
+
+    if limit:
+        books_q = books_q.limit(limit)
+    return books_q
@@ -0,0 +1,309 @@
+"""Datos sintéticos a gran escala (millones de filas) para pruebas de volumen.
+
+Genera libros, usuarios, pedidos e ítems con distribuciones parecidas a las
+reales:
+
+- categorías con pesos distintos (hay muchas más novelas que poesía) y un
+  precio log-normal alrededor de la mediana de cada categoría, terminado en ,99;
+- popularidad sesgada (Zipf): pocos libros concentran la mayoría de las ventas
+  y pocos usuarios hacen muchos pedidos. El orden de popularidad se mezcla al
+  azar para que no dependa del id;
+- pedidos repartidos en ``days`` días con más volumen hacia el presente, y un
+  estado que depende de la antigüedad (los viejos están entregados).
+
+Las filas se generan en lotes y se insertan sin el ORM: ``COPY ... FROM STDIN``
+en PostgreSQL y ``executemany`` del driver en los demás motores, un commit por
+lote. Los ids se asignan desde Python (a partir del máximo actual) para
+poder relacionar pedidos e ítems sin leerlos de vuelta; en PostgreSQL las
+secuencias se ajustan al final.
+
+El índice de búsqueda se mantiene con los triggers de search.py. Después de
+cargar conviene recalcular las recomendaciones::
+
+    flask --app app generate-data --books 1000000 --users 200000 --orders 3000000
+    flask --app app rebuild-recommendations
+"""
+import csv
+import io
+import logging
+import math
+import random
+import time
+from array import array
+from datetime import timedelta
+
+from models import db, User, Book, Order, OrderItem, utcnow
+from passwords import hash_password
+
+logger = logging.getLogger(__name__)
+
+# Categoría -> (peso, precio mediano)
+CATEGORIES = {
+    'Novela': (30, 18.0),
+    'Infantil': (14, 11.0),
+    'Historia': (10, 24.0),
+    'Autoayuda': (10, 16.0),
+    'Ensayo': (9, 21.0),
+    'Ciencia': (8, 34.0),
+    'Fantasía': (8, 19.0),
+    'Biografía': (5, 22.0),
+    'Poesía': (3, 13.0),
+    'Cocina': (3, 28.0),
+}
+
+WORDS = [
+    'amor', 'canción', 'corazón', 'noche', 'ciudad', 'río', 'montaña', 'guerra',
+    'memoria', 'sombra', 'jardín', 'invierno', 'océano', 'príncipe', 'acuerdo',
+    'crónica', 'silencio', 'espejo', 'tiempo', 'camino', 'historia', 'fuego',
+    'piedra', 'viento', 'luz', 'sueño', 'isla', 'lágrima', 'reino', 'árbol',
+    'verano', 'secreto', 'frontera', 'casa', 'mar', 'desierto', 'promesa', 'viaje',
+]
+FIRST_NAMES = ['Ana', 'Carlos', 'Lucía', 'Jorge', 'Marta', 'Diego', 'Sofía', 'Pablo', 'Elena', 'Andrés',
+               'Valeria', 'Tomás', 'Isabel', 'Mateo', 'Camila', 'Julián']
+LAST_NAMES = ['García', 'Martínez', 'López', 'Muñoz', 'Sánchez', 'Pérez', 'Gómez', 'Díaz', 'Rojas',
+              'Herrera', 'Castro', 'Vargas', 'Ramírez', 'Torres', 'Flores', 'Morales']
+
+# Ítems por pedido (1..6) y unidades por ítem (1..3)
+ITEMS_WEIGHTS = [50, 25, 12, 7, 4, 2]
+QUANTITY_WEIGHTS = [80, 15, 5]
+
+PASSWORD = 'synthetic'
+
+# Formato de fecha con el que SQLAlchemy guarda DateTime en SQLite (también
+# válido para COPY en PostgreSQL); así las comparaciones de texto siguen funcionando
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+BOOK_COLUMNS = ('id', 'title', 'author', 'price', 'stock', 'description', 'category')
+USER_COLUMNS = ('id', 'username', 'email', 'password_hash', 'role', 'fav_category1', 'fav_category2')
+ORDER_COLUMNS = ('id', 'user_id', 'created_at', 'status', 'total')
+ITEM_COLUMNS = ('id', 'order_id', 'book_id', 'quantity', 'price')
+
+
+def zipf_cum_weights(n, skew):
+    """Pesos acumulados 1/rango^skew para ``random.choices``."""
+    total = 0.0
+    cum = array('d')
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** skew
+        cum.append(total)
+    return cum
+
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def _cumulative(weights):
+    total, cum = 0, []
+    for w in weights:
+        total += w
+        cum.append(total)
+    return cum
+
+
+CATEGORY_NAMES = list(CATEGORIES)
+CATEGORY_CUM = _cumulative(w for w, _ in CATEGORIES.values())
+ITEMS_CUM = _cumulative(ITEMS_WEIGHTS)
+QUANTITY_CUM = _cumulative(QUANTITY_WEIGHTS)
+
+# (antigüedad máxima en días, estados, pesos acumulados)
+STATUS_BY_AGE = [
+    (1, ['created', 'paid', 'cancelled'], _cumulative([40, 50, 10])),
+    (4, ['paid', 'shipped', 'cancelled'], _cumulative([40, 50, 10])),
+    (math.inf, ['delivered', 'cancelled'], _cumulative([92, 8])),
+]
+
+
+def status_for_age(rng, age_days):
+    for max_age, statuses, cum in STATUS_BY_AGE:
+        if age_days < max_age:
+            return rng.choices(statuses, cum_weights=cum)[0]
+
+
+# --- Generadores (lotes de tuplas en el orden de *_COLUMNS) ---
+def book_batches(rng, first_id, total, batch_size):
+    for start in range(0, total, batch_size):
+        rows = []
+        for book_id in range(first_id + start, first_id + min(start + batch_size, total)):
+            category = rng.choices(CATEGORY_NAMES, cum_weights=CATEGORY_CUM)[0]
+            median = CATEGORIES[category][1]
+            price = math.floor(max(rng.lognormvariate(math.log(median), 0.35), 3)) + 0.99
+            stock = 0 if rng.random() < 0.05 else rng.randint(1, 200)
+            rows.append((
+                book_id,
+                ' '.join(rng.sample(WORDS, rng.randint(2, 4))).capitalize(),
+                f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                price,
+                stock,
+                ' '.join(rng.choices(WORDS, k=rng.randint(12, 30))).capitalize() + '.',
+                category,
+            ))
+        yield rows
+
+
+def user_batches(rng, first_id, total, batch_size, password_hash):
+    for start in range(0, total, batch_size):
+        rows = []
+        for user_id in range(first_id + start, first_id + min(start + batch_size, total)):
+            fav1, fav2 = rng.choices(CATEGORY_NAMES, cum_weights=CATEGORY_CUM, k=2)
+            rows.append((user_id, f'synth{user_id}', f'synth{user_id}@example.com', password_hash, 'user', fav1, fav2))
+        yield rows
+
+
+def order_batches(rng, first_order_id, first_item_id, total, batch_size, book_ids, book_prices, user_ids,
+                  days, skew):
+    """Lotes ``(pedidos, ítems)``. Libros y usuarios se eligen con sesgo Zipf."""
+    book_rank = list(range(len(book_ids)))
+    rng.shuffle(book_rank)
+    book_cum = zipf_cum_weights(len(book_ids), skew)
+    user_rank = list(range(len(user_ids)))
+    rng.shuffle(user_rank)
+    user_cum = zipf_cum_weights(len(user_ids), skew / 2)
+
+    now = utcnow()
+    item_id = first_item_id
+    for start in range(0, total, batch_size):
+        orders, items = [], []
+        for order_id in range(first_order_id + start, first_order_id + min(start + batch_size, total)):
+            # Densidad creciente hacia el presente
+            age = days * (1 - math.sqrt(rng.random()))
+            user = user_ids[user_rank[rng.choices(range(len(user_ids)), cum_weights=user_cum)[0]]]
+            n_items = rng.choices(range(1, len(ITEMS_CUM) + 1), cum_weights=ITEMS_CUM)[0]
+            picked = {book_rank[i] for i in rng.choices(range(len(book_ids)), cum_weights=book_cum, k=n_items)}
+            total_price = 0.0
+            for index in picked:
+                quantity = rng.choices((1, 2, 3), cum_weights=QUANTITY_CUM)[0]
+                price = book_prices[index]
+                items.append((item_id, order_id, book_ids[index], quantity, price))
+                item_id += 1
+                total_price += price * quantity
+            created_at = (now - timedelta(days=age)).strftime(DATETIME_FORMAT)
+            orders.append((order_id, user, created_at, status_for_age(rng, age),
+                           round(total_price, 2)))
+        yield orders, items
+
+
+# --- Carga en bloque ---
+class BulkLoader:
+    """Inserta lotes de tuplas: COPY en PostgreSQL, executemany del driver en el resto."""
+
+    PLACEHOLDERS = {'qmark': '?', 'format': '%s', 'pyformat': '%s', 'numeric': ':{n}', 'named': ':c{n}'}
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.postgres = engine.dialect.name == 'postgresql'
+        self.conn = engine.raw_connection()
+        if engine.dialect.name == 'sqlite':
+            # Solo durante la carga: sin fsync por commit
+            cursor = self.conn.cursor()
+            cursor.execute('PRAGMA synchronous = OFF')
+            cursor.close()
+
+    def _insert_sql(self, table, columns):
+        placeholder = self.PLACEHOLDERS[self.engine.dialect.paramstyle]
+        values = ', '.join(placeholder.format(n=n) for n in range(1, len(columns) + 1))
+        return f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({values})"
+
+    def load(self, table, columns, rows):
+        if not rows:
+            return
+        if self.postgres:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            with self.conn.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            self.conn.commit()
+        else:
+            cursor = self.conn.cursor()
+            if self.engine.dialect.paramstyle == 'named':
+                rows = [{f'c{n}': v for n, v in enumerate(row, 1)} for row in rows]
+            cursor.executemany(self._insert_sql(table, columns), rows)
+            cursor.close()
+            self.conn.commit()
+
+    def reset_sequences(self, tables):
+        if not self.postgres:
+            return
+        with self.conn.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                               f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def secondary_indexes(tables):
+    """Índices no únicos definidos en los modelos (se pueden recrear sin riesgo)."""
+    return [index for table in tables for index in table.indexes if not index.unique]
+
+
+def generate(books=0, users=0, orders=0, batch_size=10_000, days=730, skew=1.1, seed=1,
+             defer_indexes=False, progress=print):
+    """Genera e inserta los datos. Devuelve ``{tabla: filas}``. Requiere app context.
+
+    Con ``defer_indexes`` los índices secundarios de las tablas que se cargan se
+    borran antes y se vuelven a crear al final: un índice construido de una vez
+    es más rápido que mantenerlo fila por fila.
+    """
+    rng = random.Random(seed)
+    counts = {}
+    tables = [model.__table__ for model, n in ((Book, books), (User, users), (Order, orders), (OrderItem, orders)) if n]
+    deferred = secondary_indexes(tables) if defer_indexes else []
+    if deferred:
+        with db.engine.begin() as conn:
+            for index in deferred:
+                index.drop(conn, checkfirst=True)
+    loader = BulkLoader(db.engine)
+    try:
+        def run(name, table, columns, batches):
+            t0 = time.perf_counter()
+            rows = 0
+            for batch in batches:
+                loader.load(table, columns, batch)
+                rows += len(batch)
+                progress(f'{name}: {rows:,} filas ({rows / (time.perf_counter() - t0):,.0f}/s)')
+            counts[name] = rows
+
+        if books:
+            run('books', Book.__table__, BOOK_COLUMNS, book_batches(rng, _next_id(Book), books, batch_size))
+        if users:
+            # Un solo hash para todos: hashear por usuario dominaría el tiempo de carga
+            password_hash = hash_password(PASSWORD)
+            run('users', User.__table__, USER_COLUMNS,
+                user_batches(rng, _next_id(User), users, batch_size, password_hash))
+        if orders:
+            book_rows = db.session.query(Book.id, Book.price).order_by(Book.id).all()
+            user_ids = array('q', (i for (i,) in db.session.query(User.id).filter(User.role != 'admin')))
+            if not book_rows or not user_ids:
+                raise ValueError('Para generar pedidos hacen falta libros y usuarios.')
+            book_ids = array('q', (b for b, _ in book_rows))
+            book_prices = array('d', (p for _, p in book_rows))
+            del book_rows
+
+            t0 = time.perf_counter()
+            n_orders = n_items = 0
+            for order_rows, item_rows in order_batches(
+                    rng, _next_id(Order), _next_id(OrderItem), orders, batch_size,
+                    book_ids, book_prices, user_ids, days, skew):
+                loader.load(Order.__table__, ORDER_COLUMNS, order_rows)
+                loader.load(OrderItem.__table__, ITEM_COLUMNS, item_rows)
+                n_orders += len(order_rows)
+                n_items += len(item_rows)
+                progress(f'orders: {n_orders:,} pedidos, {n_items:,} ítems '
+                         f'({(n_orders + n_items) / (time.perf_counter() - t0):,.0f} filas/s)')
+            counts['orders'] = n_orders
+            counts['order_items'] = n_items
+
+        loader.reset_sequences(tables)
+    finally:
+        loader.close()
+        db.session.remove()
+        if deferred:
+            progress(f'recreando {len(deferred)} índices...')
+            with db.engine.begin() as conn:
+                for index in deferred:
+                    index.create(conn, checkfirst=True)
+    return counts
@@ -0,0 +1,95 @@
+"""Las páginas con listas de pedidos y del carrito no deben hacer consultas N+1.
+
+Se corren con ``SQL_QUERY_LIMIT`` en modo ``TESTING``: si una página vuelve a
+cargar relaciones de a una (lazy load por ítem), querycount.py lanza
+``TooManyQueries`` y la prueba falla. Los datos tienen varios pedidos e ítems
+para que un N+1 supere el límite.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+_tmp = tempfile.mkdtemp(prefix='libreria-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.sqlite3')
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['INVOICE_DIR'] = os.path.join(_tmp, 'invoices')
+
+from app import app  # noqa: E402
+from models import db, User, Book, Cart, CartItem, Order, OrderItem  # noqa: E402
+from querycount import TooManyQueries, count_queries  # noqa: E402
+
+# Hoy las páginas hacen de 1 a 3 sentencias (la lista y sus relaciones en
+# bloque); un lazy load por ítem de los datos de abajo pasa holgado de 5
+QUERY_LIMIT = 5
+BOOKS = 8
+ORDERS = 6
+ITEMS_PER_ORDER = 5
+
+
+class QueryCountTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SQL_QUERY_LIMIT=QUERY_LIMIT)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username='lector', email='lector@example.com')
+            user.set_password('secreto')
+            books = [Book(title=f'Libro {i}', author=f'Autor {i}', price=10 + i, stock=100,
+                          category='Novela' if i % 2 else 'Ensayo') for i in range(BOOKS)]
+            db.session.add_all([user] + books)
+            db.session.flush()
+            cart = Cart(user_id=user.id)
+            db.session.add(cart)
+            db.session.flush()
+            db.session.add_all([CartItem(cart_id=cart.id, book_id=b.id, quantity=1) for b in books])
+            for n in range(ORDERS):
+                order = Order(user_id=user.id, status='paid', total=0)
+                db.session.add(order)
+                db.session.flush()
+                for b in books[:ITEMS_PER_ORDER]:
+                    db.session.add(OrderItem(order_id=order.id, book_id=b.id, quantity=1, price=b.price))
+            db.session.commit()
+            cls.order_id = order.id
+
+    @classmethod
+    def tearDownClass(cls):
+        app.config['SQL_QUERY_LIMIT'] = 0
+
+    def setUp(self):
+        self.client = app.test_client()
+        response = self.client.post('/login', data={'email': 'lector@example.com', 'password': 'secreto'})
+        self.assertEqual(response.status_code, 302)
+
+    def get(self, url):
+        with count_queries() as counter:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(counter.count, QUERY_LIMIT, counter.statements)
+        return counter
+
+    def test_cart(self):
+        self.get('/cart')
+
+    def test_orders(self):
+        self.get('/orders')
+
+    def test_order_detail(self):
+        self.get(f'/orders/{self.order_id}')
+
+    def test_guard_detects_excess(self):
+        """La verificación está activa: con un límite mínimo la página falla."""
+        app.config['SQL_QUERY_LIMIT'] = 1
+        try:
+            with self.assertRaises(TooManyQueries):
+                self.client.get('/cart')
+        finally:
+            app.config['SQL_QUERY_LIMIT'] = QUERY_LIMIT
+
+
+if __name__ == '__main__':
+    unittest.main()
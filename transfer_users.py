@@ -1,54 +1,221 @@
-from sqlalchemy import create_engine, MetaData, Table, select
-from sqlalchemy.orm import sessionmaker
+"""Migra todos los datos de la base SQLite a PostgreSQL.
+
+Copia las tablas de los modelos en orden de dependencias (users, books, carts,
+cart_items, orders, order_items, ...) en lotes leídos por clave primaria, así
+que la memoria no depende del tamaño de la base. Cada lote se inserta con
+``INSERT ... ON CONFLICT DO NOTHING``: volver a correr el script no duplica ni
+pisa filas que ya están en el destino.
+
+Después de cada lote se guarda un checkpoint (última clave copiada por tabla);
+si el proceso se corta, la siguiente ejecución sigue desde ahí. Al terminar
+cada tabla se ajusta su secuencia de ids en PostgreSQL.
+
+Las columnas se copian por nombre (las que existan en ambas bases). Las bases
+SQLite viejas con ``users.is_admin`` en lugar de ``role`` se convierten.
+
+Si un lote falla por una restricción (p. ej. un ítem que apunta a un pedido que
+no existe, algo que SQLite permite), ese lote se reintenta fila por fila y las
+filas rechazadas se informan al final.
+
+Uso (con las migraciones ya aplicadas en PostgreSQL)::
+
+    DATABASE_URL=postgresql://... python transfer_users.py
+    python transfer_users.py --source sqlite:///otra.sqlite3 --target postgresql://... --batch-size 10000
+    python transfer_users.py --restart          # ignora el checkpoint y empieza de cero
+"""
+import argparse
+import json
 import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import MetaData, Table, create_engine, func, inspect, select, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import db
 
 basedir = os.path.abspath(os.path.dirname(__file__))
-sqlite_uri = 'sqlite:///' + os.path.join(basedir, 'db.sqlite3')
-pg_uri = os.environ.get('DATABASE_URL')
-
-if not pg_uri:
-    raise SystemExit('Setea la variable de entorno DATABASE_URL apuntando a Postgres antes de ejecutar.')
-
-engine_sqlite = create_engine(sqlite_uri)
-engine_pg = create_engine(pg_uri)
-
-SessionSQLite = sessionmaker(bind=engine_sqlite)
-SessionPG = sessionmaker(bind=engine_pg)
-
-s_sql = SessionSQLite()
-s_pg = SessionPG()
-
-meta = MetaData(bind=engine_sqlite)
-users_table_sql = Table('users', meta, autoload_with=engine_sqlite)
-
-# asumimos la misma estructura en Postgres (migraciones aplicadas)
-meta_pg = MetaData(bind=engine_pg)
-users_table_pg = Table('users', meta_pg, autoload_with=engine_pg)
-
-rows = s_sql.execute(select(users_table_sql)).fetchall()
-print(f"Usuarios encontrados en sqlite: {len(rows)}")
-
-for r in rows:
-    username = r['username']
-    email = r['email']
-    password_hash = r['password_hash']
-    is_admin = bool(r['is_admin'])
-
-    existing = s_pg.execute(select(users_table_pg).where(users_table_pg.c.email == email)).first()
-    if existing:
-        print(f"Saltando {email}, ya existe en Postgres.")
-        continue
-
-    ins = users_table_pg.insert().values(
-        username=username,
-        email=email,
-        password_hash=password_hash,
-        is_admin=is_admin
-    )
-    s_pg.execute(ins)
-    print(f"Copiado: {email}")
-
-s_pg.commit()
-s_sql.close()
-s_pg.close()
-print('Transferencia completada.')
+
+
+def insert_ignoring_conflicts(table, dialect):
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    raise SystemExit(f'Base de destino no soportada: {dialect}')
+
+
+def adapt_users(row, source_columns):
+    """Bases viejas: ``is_admin`` (booleano) en lugar de ``role``."""
+    if 'role' not in source_columns and 'is_admin' in source_columns:
+        row['role'] = 'admin' if row.pop('is_admin') else 'user'
+    return row
+
+
+ADAPTERS = {'users': adapt_users}
+
+
+class Checkpoint:
+    """Última clave copiada por tabla, guardada en un JSON (escritura atómica)."""
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.state = {}
+        if not restart and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def get(self, table):
+        return self.state.get(table, {'last': None, 'rows': 0, 'done': False})
+
+    def save(self, table, **values):
+        self.state[table] = {**self.get(table), **values}
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, default=str)
+        os.replace(tmp, self.path)
+
+
+def reset_sequence(conn, table):
+    """Ajusta la secuencia del id al máximo copiado (solo PostgreSQL)."""
+    if conn.dialect.name != 'postgresql' or list(table.primary_key.columns.keys()) != ['id']:
+        return
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+    ))
+
+
+def insert_batch(target, statement, rows, rejected):
+    """Inserta el lote en una transacción; si falla una restricción, fila por fila."""
+    try:
+        with target.begin() as conn:
+            result = conn.execute(statement, rows)
+            return result.rowcount
+    except IntegrityError:
+        pass
+    inserted = 0
+    for row in rows:
+        try:
+            with target.begin() as conn:
+                inserted += max(conn.execute(statement, [row]).rowcount, 0)
+        except IntegrityError as e:
+            rejected['count'] += 1
+            if len(rejected['samples']) < 20:
+                rejected['samples'].append((row, str(e.orig).splitlines()[0]))
+    return inserted
+
+
+def copy_table(source, target, source_meta, table, batch_size, checkpoint, rejected):
+    name = table.name
+    state = checkpoint.get(name)
+    if state['done']:
+        print(f'{name}: ya copiada ({state["rows"]:,} filas), se omite')
+        return state['rows']
+    if not inspect(source).has_table(name):
+        print(f'{name}: no existe en el origen, se omite')
+        checkpoint.save(name, done=True)
+        return 0
+
+    src = Table(name, source_meta, autoload_with=source)
+    source_columns = set(src.columns.keys())
+    adapter = ADAPTERS.get(name)
+    columns = [c for c in table.columns.keys() if c in source_columns]
+    extra = [c for c in ('is_admin',) if adapter and c in source_columns and c not in columns]
+    pk = [src.columns[c] for c in table.primary_key.columns.keys()]
+    key = pk[0] if len(pk) == 1 else tuple_(*pk)
+    statement = insert_ignoring_conflicts(table, target.dialect.name)
+
+    with source.connect() as conn:
+        total = conn.execute(select(func.count()).select_from(src)).scalar()
+    copied, last = state['rows'], state['last']
+    inserted_total = 0
+    t0 = time.perf_counter()
+    print(f'{name}: {total:,} filas en el origen' + (f', continuando desde {last}' if last is not None else ''))
+
+    while True:
+        query = select(*[src.columns[c] for c in columns + extra]).order_by(*pk).limit(batch_size)
+        if last is not None:
+            query = query.where(key > (last[0] if len(pk) == 1 else tuple(last)))
+        with source.connect() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(query)]
+        if not rows:
+            break
+        if adapter:
+            rows = [adapter(row, source_columns) for row in rows]
+        inserted = insert_batch(target, statement, rows, rejected)
+        # Algunos drivers no informan filas afectadas en executemany (-1)
+        inserted_total = inserted_total + inserted if inserted_total is not None and inserted >= 0 else None
+        last = [rows[-1][c.name] for c in pk]
+        copied += len(rows)
+        checkpoint.save(name, last=last, rows=copied)
+
+        elapsed = time.perf_counter() - t0
+        rate = (copied - state['rows']) / elapsed if elapsed else 0
+        eta = (total - copied) / rate if rate else 0
+        print(f'\r  {copied:,}/{total:,} filas ({rate:,.0f}/s, faltan ~{eta:,.0f} s)', end='', flush=True)
+
+    with target.begin() as conn:
+        reset_sequence(conn, table)
+    checkpoint.save(name, done=True)
+    elapsed = time.perf_counter() - t0
+    inserted_msg = ''
+    if inserted_total is not None:
+        inserted_msg = f', {inserted_total:,} nuevas'
+        if copied - state['rows'] > inserted_total:
+            inserted_msg += f", {copied - state['rows'] - inserted_total:,} ya existían o se rechazaron"
+    print(f'\r  {copied:,} filas leídas{inserted_msg} en {elapsed:.1f} s' + ' ' * 20)
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default='sqlite:///' + os.path.join(basedir, 'db.sqlite3'),
+                        help='Base de origen (por defecto db.sqlite3)')
+    parser.add_argument('--target', default=os.environ.get('DATABASE_URL'),
+                        help='Base de destino (por defecto DATABASE_URL)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--tables', help='Solo estas tablas, separadas por comas (respetando dependencias)')
+    parser.add_argument('--checkpoint', default=os.path.join(basedir, 'instance', 'transfer_checkpoint.json'))
+    parser.add_argument('--restart', action='store_true', help='Ignorar el checkpoint y empezar de cero')
+    args = parser.parse_args()
+
+    if not args.target:
+        raise SystemExit('Setea la variable de entorno DATABASE_URL apuntando a Postgres antes de ejecutar.')
+    if args.target == args.source:
+        raise SystemExit('El origen y el destino son la misma base.')
+
+    source = create_engine(args.source)
+    target = create_engine(args.target)
+    checkpoint = Checkpoint(args.checkpoint, restart=args.restart)
+
+    missing = [t.name for t in db.metadata.sorted_tables if not inspect(target).has_table(t.name)]
+    if missing:
+        raise SystemExit(f'Faltan tablas en el destino ({", ".join(missing)}): aplica las migraciones primero.')
+
+    only = set(args.tables.split(',')) if args.tables else None
+    source_meta = MetaData()
+    rejected = {'count': 0, 'samples': []}
+    t0 = time.perf_counter()
+    total = 0
+    for table in db.metadata.sorted_tables:
+        if only and table.name not in only:
+            continue
+        total += copy_table(source, target, source_meta, table, args.batch_size, checkpoint, rejected)
+
+    elapsed = time.perf_counter() - t0
+    print(f'Transferencia completada: {total:,} filas en {elapsed:.1f} s'
+          + (f' ({total / elapsed:,.0f} filas/s)' if elapsed else ''))
+    if rejected['count']:
+        print(f"{rejected['count']:,} filas rechazadas por restricciones del destino, por ejemplo:")
+        for row, error in rejected['samples']:
+            print(f'  {row}: {error}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
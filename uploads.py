@@ -0,0 +1,180 @@
+"""Subida de portadas en streaming, con límite de tamaño y validación temprana.
+
+``UploadRequest`` reemplaza el almacenamiento temporal de werkzeug para los
+archivos de imagen: cada bloque que llega se escribe directamente en un
+archivo temporal dentro de ``UPLOAD_FOLDER`` (nunca en memoria) y a la vez:
+
+- se suma al SHA-256 (el nombre final de la portada, ver images.py);
+- se controla el tamaño contra ``MAX_CONTENT_LENGTH``;
+- con los primeros KB se reconoce el formato por sus bytes mágicos (JPEG, PNG,
+  WebP) y se leen las dimensiones de la cabecera.
+
+Si algo no cuadra la subida se corta en ese momento con 413/415, sin esperar a
+recibir el resto del archivo. Al final ``ImageUpload.claim()`` mueve el
+temporal a su nombre definitivo con un rename atómico (mismo sistema de
+archivos). Los temporales que no se usan se borran al cerrar la petición.
+
+Nota: con workers sync de gunicorn una subida lenta igual ocupa el worker
+mientras llega; en producción conviene un proxy que reciba el cuerpo completo
+antes de pasarlo (nginx, ``proxy_request_buffering on``), ver docs/INSTALACION.md.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import Request, current_app
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# Formato de Pillow -> extensión del archivo guardado
+IMAGE_TYPES = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+# Bytes en los que tiene que aparecer la cabecera con las dimensiones
+SNIFF_LIMIT = 64 * 1024
+MIN_SIDE = 16
+
+# mkstemp crea los temporales con 0600; las portadas son archivos estáticos
+# públicos (los puede servir nginx con otro usuario): 0644 menos el umask.
+# El umask solo se lee cambiándolo, por eso se hace una vez al importar.
+_umask = os.umask(0o022)
+os.umask(_umask)
+PUBLIC_FILE_MODE = 0o644 & ~_umask
+
+
+class InvalidImage(UnsupportedMediaType):
+    pass
+
+
+class ImageTooLarge(RequestEntityTooLarge):
+    pass
+
+
+def human_size(size):
+    if size >= 1024 * 1024:
+        return f'{size / (1024 * 1024):g} MB'
+    return f'{size / 1024:g} KB'
+
+
+def detect_format(head):
+    """Formato según los bytes mágicos, o None."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class ImageUpload:
+    """Archivo temporal que valida la imagen mientras se escribe.
+
+    Se comporta como un archivo (werkzeug escribe, hace ``seek(0)`` y lo
+    entrega en ``FileStorage.stream``); el resto de métodos se delegan.
+    """
+
+    def __init__(self, directory, max_size=None, max_pixels=None):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.tmp')
+        self._file = os.fdopen(fd, 'w+b')
+        self.max_size = max_size
+        self.max_pixels = max_pixels
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.format = None
+        self.dimensions = None
+        self._head = bytearray()
+        self._claimed = False
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            self.close()
+            raise ImageTooLarge(f'La imagen supera el tamaño máximo de {human_size(self.max_size)}.')
+        if self.dimensions is None:
+            self._sniff(data)
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def _sniff(self, data):
+        self._head += data
+        if len(self._head) < 12:
+            return
+        if self.format is None:
+            self.format = detect_format(bytes(self._head[:12]))
+            if self.format is None:
+                self._reject('El archivo no es una imagen JPEG, PNG o WebP.')
+        try:
+            with Image.open(io.BytesIO(self._head), formats=[self.format]) as image:
+                width, height = image.size
+        except Exception:
+            # Cabecera incompleta: se espera el siguiente bloque, hasta SNIFF_LIMIT
+            if len(self._head) >= SNIFF_LIMIT:
+                self._reject('No se pudo leer la cabecera de la imagen.')
+            return
+        if min(width, height) < MIN_SIDE:
+            self._reject(f'La imagen es demasiado pequeña ({width}x{height}).')
+        if self.max_pixels and width * height > self.max_pixels:
+            self._reject(f'La imagen tiene demasiados píxeles ({width}x{height}).')
+        self.dimensions = (width, height)
+        self._head = None
+
+    def _reject(self, message):
+        self.close()
+        raise InvalidImage(message)
+
+    def check_complete(self):
+        """Falla si el archivo terminó antes de poder leer sus dimensiones."""
+        if self.dimensions is None:
+            self._reject('El archivo no es una imagen válida.')
+
+    def claim(self, path):
+        """Mueve el temporal a ``path`` (rename atómico). Si ya existe un archivo
+        con ese nombre (mismo contenido) descarta el temporal. Devuelve si se movió.
+        """
+        self._file.flush()
+        if os.path.exists(path):
+            self.close()
+            return False
+        os.chmod(self.path, PUBLIC_FILE_MODE)
+        os.replace(self.path, path)
+        self._claimed = True
+        self._file.close()
+        return True
+
+    def close(self):
+        self._file.close()
+        if not self._claimed:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def image_upload_from(f):
+    """``ImageUpload`` de un ``FileStorage``; si la subida no pasó por
+    ``UploadRequest`` (p. ej. tipo MIME que no es de imagen) se copia validando."""
+    if isinstance(f.stream, ImageUpload):
+        return f.stream
+    config = current_app.config
+    upload = ImageUpload(config['UPLOAD_FOLDER'], config.get('MAX_CONTENT_LENGTH'), config.get('MAX_IMAGE_PIXELS'))
+    for chunk in iter(lambda: f.stream.read(SNIFF_LIMIT), b''):
+        upload.write(chunk)
+    return upload
+
+
+class UploadRequest(Request):
+    """Request que guarda las imágenes subidas con ``ImageUpload``."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = os.path.splitext(filename or '')[1].lower()
+        if (content_type or '').startswith('image/') or extension in IMAGE_EXTENSIONS:
+            config = current_app.config
+            return ImageUpload(config['UPLOAD_FOLDER'], config.get('MAX_CONTENT_LENGTH'),
+                               config.get('MAX_IMAGE_PIXELS'))
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)